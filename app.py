@@ -1,38 +1,84 @@
-from flask import Flask, request, make_response
-from flask_migrate import Migrate
+from flask import Flask, Response, current_app, g, request, make_response, send_file, stream_with_context
+from flask.cli import with_appcontext
 from flask_restful import Resource,Api
-from models import db, bcrypt, User, UserRole, HealthProgram, Client, Enrollment
+from models import (
+    db, bcrypt, password_hasher, User, UserRole, HealthProgram, Client, Enrollment, Job,
+    ENROLLMENT_TRANSITIONS
+)
+from sqlalchemy import func, event, true, tuple_
 from dotenv import load_dotenv
 import os
 import jwt
 import datetime
 from functools import wraps
+from collections import namedtuple
 from flask_cors import CORS
+from cache import TTLCache
+from importer import import_clients
+from exporter import export_csv, export_ndjson
+from search import search_clients
+from stats import enrollment_statistics
+from enrollments import parse_ids, enroll_pairs, transition_enrollments
+from changes import changes_since, InvalidCursor
+from dedupe import find_duplicates, iter_duplicate_pairs
+from batch import commit_unless_batched, run_batch
+from hashing import PasswordHasherBusy
+from jobs import submit_job, run_workers, job_file, JobError
+from serializers import (
+    columns, narrow, serialize_client, serialize_enrollment, serialize_program, serialize_job,
+    CLIENT_FIELDS, PROGRAM_FIELDS
+)
+from json_provider import FastJSONProvider
+from compression import Compress
+from metrics import Metrics
+from routing import engine_options, read_replica, ReplicaRouting, REPLICA_BIND
+from conditional import (
+    conditional_response, latest, client_validators, clients_validators,
+    programs_validators, program_validators
+)
+import click
+import io
+import json
 
 
-# flask app configuration
-app = Flask(__name__, static_url_path='')
-CORS(app, origins=["http://localhost:5173","https://his-frontend.onrender.com"])
+# Extensions and resources are set up here and bound to an app by create_app()
+metrics = Metrics()
+api = Api()
 
-# Load environment variables
-load_dotenv()
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.json.compact = False
 
-# Initialize the database and bcrypt
-migrate = Migrate(app, db)
-db.init_app(app)
-bcrypt.init_app(app)
-api = Api(app)
+# The authenticated user, read from the token's claims
+CurrentUser = namedtuple('CurrentUser', ['id', 'username', 'email', 'role', 'token_version'])
 
+# Current token version of recently seen users, so token checks skip the database on a hit
+token_versions = TTLCache()
+
+
+# Drop a user's version from the cache whenever their row changes
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_token_version(mapper, connection, target):
+    token_versions.pop(target.id)
+
+
+# None when the user no longer exists
+def get_token_version(user_id):
+    version = token_versions.get(user_id)
+    if version is None:
+        version = db.session.query(User.token_version).filter(User.id == user_id).scalar()
+        if version is None:
+            return None
+        token_versions.set(user_id, version)
+    return version
 
 
 # Decorator to check if the user is authenticated
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        # Operations inside /batch run as the user who sent the batch
+        if g.get('batch_user') is not None:
+            return f(*args, current_user=g.batch_user, **kwargs)
+        
         token = None
         if 'Authorization' in request.headers:
             token = request.headers['Authorization'].split(" ")[1]
@@ -42,12 +88,24 @@ def token_required(f):
         
         try:
             # Decode the token
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
+            data = jwt.decode(
+                token, current_app.config['SECRET_KEY'], algorithms=["HS256"],
+                options={"require": ["user_id", "username", "email", "role", "token_version"]}
+            )
+            # The role and the user's details come from the claims; only the
+            # token version is checked against the (cached) user row
+            current_user = CurrentUser(
+                data['user_id'], data['username'], data['email'], UserRole[data['role']], data['token_version']
+            )
+            token_version = get_token_version(current_user.id)
             
             # Check if the user exists
-            if current_user is None:
+            if token_version is None:
                 return make_response({"error": "User not found!"}, 404)
+            
+            # Reject tokens issued before the user's tokens were revoked
+            if current_user.token_version != token_version:
+                return make_response({"error": "Token revoked!"}, 401)
         
         except jwt.ExpiredSignatureError:
             return make_response({"error": "Token expired!"}, 401)
@@ -56,20 +114,163 @@ def token_required(f):
         except Exception as e:
             return make_response({"error": str(e)}, 401)
         
-        # Pass current_user as a keyword argument
+        # Pass current_user as a keyword argument; request hooks find it on g
+        g.current_user = current_user
         return f(*args, current_user=current_user, **kwargs)
     
     return decorated
 
 
+# 503 with Retry-After when the password hashing pool is full. Answered by the
+# resources themselves, as Flask-RESTful logs a traceback for every raised 5xx.
+def hasher_busy_response(error):
+    response = make_response(error.data, 503)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+# Read `limit` and `after` query parameters for keyset pagination
+def parse_page_args():
+    try:
+        limit = int(request.args.get('limit', current_app.config['PAGE_SIZE_DEFAULT']))
+        after = request.args.get('after')
+        after = int(after) if after is not None else None
+    except ValueError:
+        raise ValueError("limit and after must be integers")
+
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if after is not None and after < 0:
+        raise ValueError("after must be a positive id")
+
+    return min(limit, current_app.config['PAGE_SIZE_MAX']), after
+
+
+# Read the `fields` and `include` query parameters: which of `available`
+# columns to return (id always comes back) and which of `relations` to embed.
+# Without either parameter everything is returned, as before; once `fields`
+# is given, relations are only embedded when listed in `include`.
+def parse_fieldset(available, relations):
+    def parse(name, allowed):
+        requested = {value.strip() for value in request.args[name].split(',') if value.strip()}
+        unknown = requested - set(allowed)
+        if unknown:
+            raise ValueError(f"Unknown {name}: {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}")
+        return requested
+
+    fields = available
+    if 'fields' in request.args:
+        requested = parse('fields', available)
+        fields = tuple(field for field in available if field in requested or field == 'id')
+    if 'include' in request.args:
+        include = parse('include', relations)
+    else:
+        include = set() if 'fields' in request.args else set(relations)
+    return fields, include
+
+
+# Enrollment rows carrying the client and program names, for serialize_enrollment
+def enrollment_query(*criteria):
+    return db.session.query(
+        Enrollment.id,
+        Enrollment.client_id,
+        Enrollment.program_id,
+        Client.full_name.label('client_name'),
+        HealthProgram.name.label('program_name'),
+        Enrollment.enrolled_at,
+        Enrollment.status
+    ).join(
+        Client, Client.id == Enrollment.client_id
+    ).join(
+        HealthProgram, HealthProgram.id == Enrollment.program_id
+    ).filter(*criteria)
+
+
+# Program rows with `fields`, and their creator's name and email joined in
+# when `creator` is set
+def program_query(*criteria, fields=PROGRAM_FIELDS, creator=True):
+    if not creator:
+        return db.session.query(*columns(HealthProgram, fields)).filter(*criteria).order_by(HealthProgram.id)
+    return db.session.query(
+        *columns(HealthProgram, fields), User.id.label('creator_id'), User.username, User.email
+    ).join(User, User.id == HealthProgram.created_by).filter(*criteria).order_by(HealthProgram.id)
+
+
+# Serialized enrollments of the given clients, grouped by client id
+def enrollments_by_client(client_ids):
+    grouped = {client_id: [] for client_id in client_ids}
+    if client_ids:
+        rows = enrollment_query(Enrollment.client_id.in_(client_ids)).order_by(Enrollment.client_id, Enrollment.id)
+        for row in rows:
+            grouped[row.client_id].append(serialize_enrollment(row))
+    return grouped
+
+
+# Serialize program rows from program_query with their creator and up to `enrollment_limit`
+# enrollments each. Enrollments for every program come back in one query, so the
+# cost does not grow with the number of programs. Passing enrollment_limit=None leaves
+# them out, and creator=False the creator.
+def serialize_programs(programs, enrollment_limit=None, enrollment_after=None, fields=PROGRAM_FIELDS, creator=True):
+    serialize = narrow(serialize_program, fields)
+    programs_data = {}
+    for program in programs:
+        program_data = serialize(program)
+        if creator:
+            program_data['creator'] = {
+                "id": program.creator_id,
+                "username": program.username,
+                "email": program.email
+            }
+        programs_data[program.id] = program_data
+
+    if enrollment_limit is None or not programs_data:
+        return list(programs_data.values())
+
+    # Each program's page is a range of at most enrollment_limit + 1 entries
+    # on the (program_id, id) index; the extra one tells whether more follow.
+    # Postgres reads the ranges through a LATERAL join, other databases
+    # through a correlated IN.
+    page = db.session.query(Enrollment.id).filter(Enrollment.program_id == HealthProgram.id)
+    if enrollment_after is not None:
+        page = page.filter(Enrollment.id > enrollment_after)
+    page = page.order_by(Enrollment.id).limit(enrollment_limit + 1)
+    programs_filter = HealthProgram.id.in_(programs_data.keys())
+    if db.session.get_bind().dialect.name == 'postgresql':
+        page = page.subquery().lateral()
+        page_ids = db.session.query(page.c.id).select_from(HealthProgram).join(page, true()).filter(programs_filter)
+    else:
+        page_ids = db.session.query(Enrollment.id).select_from(HealthProgram).join(
+            Enrollment, Enrollment.id.in_(page.correlate(HealthProgram).scalar_subquery())
+        ).filter(programs_filter)
+    enrollments = enrollment_query(Enrollment.id.in_(page_ids.scalar_subquery())).order_by(
+        Enrollment.program_id, Enrollment.id
+    )
+
+    for program_data in programs_data.values():
+        program_data['enrollments'] = []
+        program_data['enrollments_next_cursor'] = None
+    for enrollment in enrollments:
+        program_data = programs_data[enrollment.program_id]
+        if len(program_data['enrollments']) < enrollment_limit:
+            program_data['enrollments'].append(serialize_enrollment(enrollment))
+        else:
+            program_data['enrollments_next_cursor'] = program_data['enrollments'][-1]['id']
+
+    return list(programs_data.values())
+
+
 # Routes
 
 # Home Resource
-@app.route("/")
 def index():
     return make_response("<h1>Welcome to Health Information System(HIS) API</h1>", 200)
 
+# Prometheus scrape target with this worker's request and SQL metrics
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 class AdminCheck(Resource):
+    @read_replica
     def get(self):
         admin_exists = User.query.filter_by(role=UserRole.ADMIN).first() is not None
         return make_response({"admin_exists": admin_exists}, 200)
@@ -95,7 +296,10 @@ class RegisterAdmin(Resource):
             email = email,
             role = UserRole.ADMIN
         )
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except PasswordHasherBusy as e:
+            return hasher_busy_response(e)
         
         try:
             db.session.add(user)
@@ -121,14 +325,31 @@ class Login(Resource):
         
         user = User.query.filter_by(email = email).first()
         
-        if not user or not user.check_password(password):
-            return make_response({"error" : "Invalid credentials"}, 401)
+        try:
+            if not user or not user.check_password(password):
+                return make_response({"error" : "Invalid credentials"}, 401)
+        except PasswordHasherBusy as e:
+            return hasher_busy_response(e)
+        
+        # Move the hash to the configured work factor while we have the password
+        if user.password_needs_rehash():
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
         
         # Generate JWT token
+        # The user's details, role and token version travel in the claims so
+        # protected routes authorize without loading the user
         token = jwt.encode({
             "user_id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "role": user.role.name,
+            "token_version": user.token_version,
             "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
-        }, app.config['SECRET_KEY'], algorithm="HS256")
+        }, current_app.config['SECRET_KEY'], algorithm="HS256")
         
         # Return the token in the response
         return make_response({
@@ -144,6 +365,16 @@ class Login(Resource):
         
         
 
+# Logout Resource: revokes every token the user holds
+class Logout(Resource):
+    @token_required
+    def post(self, current_user):
+        user = db.session.get(User, current_user.id)
+        user.revoke_tokens()
+        db.session.commit()
+        return make_response({"message": "Logged out from all sessions"}, 200)
+
+
 # RegisterDoctor Resource
 class RegisterDoctor(Resource):
     @token_required
@@ -166,7 +397,10 @@ class RegisterDoctor(Resource):
             email=email,
             role=UserRole.DOCTOR
         )
-        doctor.set_password(password)
+        try:
+            doctor.set_password(password)
+        except PasswordHasherBusy as e:
+            return hasher_busy_response(e)
 
         db.session.add(doctor)
         db.session.commit()
@@ -205,39 +439,56 @@ class Programs(Resource):
         )
         
         db.session.add(program)
-        db.session.commit()
+        commit_unless_batched()
         
         return make_response({
             "message" : "Health program created successfully",
-            "program" : program.to_dict()
+            "program" : dict(serialize_program(program), creator={
+                "id": current_user.id,
+                "username": current_user.username,
+                "email": current_user.email
+            })
         }, 201)
        
     # GET all programs
     @token_required
+    @read_replica
     def get(self, current_user):
         if current_user.role != UserRole.DOCTOR:
             return make_response({"error": "Only doctors can view programs"}, 403)
         
-        programs = HealthProgram.query.all()
-        if not programs:
-            return make_response({"error": "No programs available yet"}, 404)
+        try:
+            fields, include = parse_fieldset(PROGRAM_FIELDS, ('enrollments', 'creator'))
+        except ValueError as e:
+            return make_response({"error": str(e)}, 400)
         
-        programs_data = []
-        for program in programs:
-            program_data = program.to_dict()
-            program_data['creator'] = {
-                "id": program.creator.id,
-                "username": program.creator.username,
-                "email": program.creator.email
-            }
-            program_data['enrollments'] = [enrollment.to_dict() for enrollment in program.enrollments]
-            programs_data.append(program_data)
+        enrollment_limit = None
+        if 'enrollments' in include and request.args.get('enrollments', 'true').lower() != 'false':
+            try:
+                enrollment_limit = int(request.args.get('enrollment_limit', current_app.config['PAGE_SIZE_DEFAULT']))
+            except ValueError:
+                return make_response({"error": "enrollment_limit must be an integer"}, 400)
+            if enrollment_limit < 1:
+                return make_response({"error": "enrollment_limit must be at least 1"}, 400)
+            enrollment_limit = min(enrollment_limit, current_app.config['PAGE_SIZE_MAX'])
         
-        return make_response(programs_data, 200)
+        def build():
+            programs = program_query(fields=fields, creator='creator' in include).all()
+            if not programs:
+                return make_response({"error": "No programs available yet"}, 404)
+            
+            programs_data = serialize_programs(programs, enrollment_limit, fields=fields, creator='creator' in include)
+            
+            return make_response(programs_data, 200)
+        
+        # Unchanged programs are answered with 304 before anything is loaded
+        validators = programs_validators()
+        return conditional_response(validators, latest(validators[1], validators[3]), build)
     
 # GET programs by ID
 class ProgramsById(Resource):
     @token_required
+    @read_replica
     def get(self, current_user, id):
         if current_user.role != UserRole.DOCTOR:
             return make_response({"error": "Only doctors can view programs"}, 403)
@@ -245,15 +496,51 @@ class ProgramsById(Resource):
         if not isinstance(id, int) or id < 1:
             return make_response({"error": "Invalid Program ID"}, 400)
 
-        program = HealthProgram.query.get(id)
-        if not program:
+        # Enrollments are paged with the same limit/after parameters as GET /clients
+        try:
+            limit, after = parse_page_args()
+            fields, include = parse_fieldset(PROGRAM_FIELDS, ('enrollments', 'creator'))
+        except ValueError as e:
+            return make_response({"error": str(e)}, 400)
+
+        validators = program_validators(id)
+        if not validators:
             return make_response({"error": "Program not found"}, 404)
 
-        program_dict = program.to_dict()
-        program_dict['enrollments'] = [enrollment.to_dict() for enrollment in program.enrollments]
+        def build():
+            program = program_query(HealthProgram.id == id, fields=fields, creator='creator' in include).first()
+            program_dict = serialize_programs(
+                [program], limit if 'enrollments' in include else None, after,
+                fields=fields, creator='creator' in include
+            )[0]
+            return make_response(program_dict, 200)
+
+        return conditional_response(validators, latest(validators[1]), build)
+
+
+
+# Enrollment statistics for every program
+class ProgramStats(Resource):
+    @token_required
+    def get(self, current_user):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can view programs"}, 403)
+        
+        return make_response(enrollment_statistics(), 200)
 
-        return make_response(program_dict, 200)
 
+# Enrollment statistics for one program
+class ProgramStatsById(Resource):
+    @token_required
+    def get(self, current_user, id):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can view programs"}, 403)
+        
+        stats = enrollment_statistics([id])
+        if not stats:
+            return make_response({"error": "Program not found"}, 404)
+        
+        return make_response(stats[0], 200)
 
     
 # Clients Resource
@@ -290,52 +577,287 @@ class Clients(Resource):
                 gender=gender
             )
             
+            # Likely duplicates are returned with the new client, or refused on request
+            duplicates = find_duplicates(
+                full_name, phone, date_of_birth,
+                threshold=current_app.config['DEDUPE_THRESHOLD'],
+                max_candidates=current_app.config['DEDUPE_MAX_CANDIDATES']
+            )
+            if duplicates and data.get('reject_duplicates'):
+                return make_response({"error": "Client may already be registered", "possible_duplicates": duplicates}, 409)
+            
             db.session.add(client)
-            db.session.commit()
+            commit_unless_batched()
             
             return make_response({
                 "message": "Patient created successfully",
-                "client": client.to_dict()
+                "client": dict(serialize_client(client), enrollments=[]),
+                "possible_duplicates": duplicates
             }, 201)
         
         except Exception as e:
             db.session.rollback()
             return {"error": str(e)}, 400
 
-    # GET all clients
+    # GET clients, one page at a time ordered by id or by age
     @token_required
+    @read_replica
     def get(self, current_user):
         if current_user.role != UserRole.DOCTOR:
             return make_response({"error": "Only doctors can view clients"}, 403)
         
-        # Fetch all clients
-        clients = Client.query.all()
-        if not clients:
-            return make_response({"error": "No clients available yet"}, 404)
+        try:
+            limit, after = parse_page_args()
+        except ValueError as e:
+            return make_response({"error": str(e)}, 400)
+        
+        sort = request.args.get('sort', 'id')
+        if sort not in ('id', 'age', '-age'):
+            return make_response({"error": "sort must be id, age or -age"}, 400)
+        try:
+            min_age = request.args.get('min_age')
+            max_age = request.args.get('max_age')
+            min_age = int(min_age) if min_age is not None else None
+            max_age = int(max_age) if max_age is not None else None
+        except ValueError:
+            return make_response({"error": "min_age and max_age must be integers"}, 400)
+        if (min_age is not None and min_age < 0) or (max_age is not None and max_age < 0):
+            return make_response({"error": "min_age and max_age cannot be negative"}, 400)
+        try:
+            fields, include = parse_fieldset(CLIENT_FIELDS, ('enrollments',))
+        except ValueError as e:
+            return make_response({"error": str(e)}, 400)
         
-        # Include enrollments in the response
-        clients_data = []
-        for client in clients:
-            client_data = client.to_dict()
-            client_data['enrollments'] = [enrollment.to_dict() for enrollment in client.enrollments]
-            clients_data.append(client_data)
+        def build():
+            # Clients are read as plain column tuples and their enrollments
+            # in one more query, so a page costs two queries whatever its size
+            # (one when enrollments are not included)
+            query = db.session.query(*columns(Client, fields)).filter(
+                *Client.aged_between(min_age, max_age)
+            )
+            if sort == 'id':
+                query = query.order_by(Client.id)
+                if after is not None:
+                    query = query.filter(Client.id > after)
+            else:
+                # Youngest first is latest birth date first. Pages are keyed on
+                # (date_of_birth, id), taking the birth date of the `after` client.
+                key = tuple_(Client.date_of_birth, Client.id)
+                query = query.order_by(*(
+                    (Client.date_of_birth.desc(), Client.id.desc()) if sort == 'age'
+                    else (Client.date_of_birth, Client.id)
+                ))
+                if after is not None:
+                    position = tuple_(
+                        db.session.query(Client.date_of_birth).filter(Client.id == after).scalar_subquery(),
+                        after
+                    )
+                    query = query.filter(key < position if sort == 'age' else key > position)
+            
+            # Fetch one extra row to tell whether another page follows
+            clients = query.limit(limit + 1).all()
+            # An age filter that matches nobody is an empty page, not an empty table
+            if not clients and after is None and min_age is None and max_age is None:
+                return make_response({"error": "No clients available yet"}, 404)
+            
+            has_more = len(clients) > limit
+            clients = clients[:limit]
+            
+            serialize = narrow(serialize_client, fields)
+            clients_data = [serialize(client) for client in clients]
+            if 'enrollments' in include:
+                enrollments = enrollments_by_client([client.id for client in clients])
+                for client_data in clients_data:
+                    client_data['enrollments'] = enrollments[client_data['id']]
+            
+            return make_response({
+                "clients": clients_data,
+                "next_cursor": clients[-1].id if has_more else None
+            }, 200)
         
-        return make_response(clients_data, 200)
+        # Unchanged pages are answered with 304 before anything is loaded
+        validators = clients_validators()
+        return conditional_response(validators, latest(validators[0], validators[2]), build)
    
                 
                 
 class ClientsById(Resource):
+    @read_replica
     def get(self, id):
         if id is None:
             return make_response({"error": "Client ID is required"}, 400)
-        # Fetch client by ID
-        client = Client.query.get(id)
-        if not client:
+        try:
+            fields, include = parse_fieldset(CLIENT_FIELDS, ('enrollments',))
+        except ValueError as e:
+            return make_response({"error": str(e)}, 400)
+        # A cheap aggregate tells whether the client exists and what version it is at
+        validators = client_validators(id)
+        if not validators:
             return make_response({"error": f"Client with ID {id} not registered"}, 404)
         
-        client_data = client.to_dict()
-        client_data['enrollments'] = [enrollment.to_dict() for enrollment in client.enrollments]
-        return make_response(client_data, 200) 
+        def build():
+            # Fetch client by ID
+            client = db.session.query(*columns(Client, fields)).filter(Client.id == id).first()
+            
+            client_data = narrow(serialize_client, fields)(client)
+            if 'enrollments' in include:
+                client_data['enrollments'] = enrollments_by_client([id])[id]
+            return make_response(client_data, 200)
+        
+        # Partner systems poll this public route, so shared caches may keep it
+        return conditional_response(validators, latest(validators[0], validators[1]), build, private=False)
+
+# Bulk client import from a CSV or NDJSON upload
+class ClientImport(Resource):
+    @token_required
+    def post(self, current_user):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can import clients"}, 403)
+        
+        # The format comes from ?format= or the Content-Type of the body
+        fmt = request.args.get('format')
+        if fmt is None:
+            fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+        if fmt not in ('csv', 'ndjson'):
+            return make_response({"error": "Format must be csv or ndjson"}, 400)
+        
+        # Read a multipart `file` field or the raw request body as it arrives
+        if request.mimetype == 'multipart/form-data':
+            if 'file' not in request.files:
+                return make_response({"error": "No file uploaded"}, 400)
+            raw = request.files['file'].stream
+        else:
+            raw = request.stream
+        stream = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        
+        # Rejected rows and the summary are streamed back as NDJSON
+        report = import_clients(stream, fmt, current_app.config['IMPORT_BATCH_SIZE'])
+        return Response(
+            stream_with_context(json.dumps(entry) + "\n" for entry in report),
+            mimetype='application/x-ndjson'
+        )
+
+
+# Client search by name, phone and date of birth
+class ClientSearch(Resource):
+    @token_required
+    def get(self, current_user):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can search clients"}, 403)
+        
+        name = request.args.get('q', '').strip()
+        phone = request.args.get('phone', '').strip()
+        
+        try:
+            dates = {}
+            for key in ('dob', 'dob_from', 'dob_to'):
+                value = request.args.get(key)
+                dates[key] = datetime.datetime.strptime(value, "%Y-%m-%d").date() if value else None
+        except ValueError:
+            return make_response({"error": "Invalid date format. Expected format: YYYY-MM-DD"}, 400)
+        
+        if not name and not phone and not any(dates.values()):
+            return make_response({"error": "Provide q, phone, dob, dob_from or dob_to"}, 400)
+        
+        try:
+            limit = min(int(request.args.get('limit', current_app.config['PAGE_SIZE_DEFAULT'])), current_app.config['PAGE_SIZE_MAX'])
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return make_response({"error": "limit and offset must be integers"}, 400)
+        if limit < 1 or offset < 0:
+            return make_response({"error": "limit must be at least 1 and offset not negative"}, 400)
+        
+        # Fetch one extra row to tell whether more results follow
+        clients = search_clients(name=name, phone=phone, limit=limit + 1, offset=offset, **dates)
+        has_more = len(clients) > limit
+        
+        return make_response({
+            "clients": [serialize_client(client) for client in clients[:limit]],
+            "next_offset": offset + limit if has_more else None
+        }, 200)
+
+
+# Registered clients that look like the given details, checked before registering
+class ClientDuplicates(Resource):
+    @token_required
+    def get(self, current_user):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can search clients"}, 403)
+        
+        full_name = request.args.get('full_name', '').strip()
+        phone = request.args.get('phone', '').strip()
+        if not full_name or not request.args.get('date_of_birth'):
+            return make_response({"error": "full_name and date_of_birth are required"}, 400)
+        try:
+            date_of_birth = datetime.datetime.strptime(request.args['date_of_birth'], "%Y-%m-%d").date()
+        except ValueError:
+            return make_response({"error": "Invalid date format. Expected format: YYYY-MM-DD"}, 400)
+        
+        return make_response({"possible_duplicates": find_duplicates(
+            full_name, phone, date_of_birth,
+            threshold=current_app.config['DEDUPE_THRESHOLD'],
+            max_candidates=current_app.config['DEDUPE_MAX_CANDIDATES']
+        )}, 200)
+
+
+# Clients and enrollments changed since a cursor, for incremental sync
+class Changes(Resource):
+    # Served from the primary: replica lag could hide rows the cursor moves past
+    @token_required
+    def get(self, current_user):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can view clients"}, 403)
+        
+        try:
+            limit = int(request.args.get('limit', current_app.config['PAGE_SIZE_DEFAULT']))
+        except ValueError:
+            return make_response({"error": "limit must be an integer"}, 400)
+        if limit < 1:
+            return make_response({"error": "limit must be at least 1"}, 400)
+        
+        since = request.args.get('since')
+        try:
+            since = datetime.datetime.fromisoformat(since) if since else None
+        except ValueError:
+            return make_response({"error": "since must be an ISO 8601 timestamp"}, 400)
+        # Timestamps are stored as naive UTC
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        
+        try:
+            changes = changes_since(
+                cursor=request.args.get('cursor'),
+                since=since,
+                limit=min(limit, current_app.config['PAGE_SIZE_MAX']),
+                lag=current_app.config['CHANGE_FEED_LAG_SECONDS']
+            )
+        except InvalidCursor as e:
+            return make_response({"error": str(e)}, 400)
+        
+        return make_response(changes, 200)
+
+
+# Streaming export of every client with their enrollments
+class ClientExport(Resource):
+    @token_required
+    def get(self, current_user):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can export clients"}, 403)
+        
+        fmt = request.args.get('format', 'ndjson')
+        if fmt == 'csv':
+            body, mimetype = export_csv(current_app.config['EXPORT_BATCH_SIZE']), 'text/csv'
+        elif fmt == 'ndjson':
+            body, mimetype = export_ndjson(current_app.config['EXPORT_BATCH_SIZE']), 'application/x-ndjson'
+        else:
+            return make_response({"error": "Format must be csv or ndjson"}, 400)
+        
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=clients.{fmt}"}
+        )
+
 
 # EnrollClient Resource
 class EnrollClient(Resource):
@@ -347,55 +869,376 @@ class EnrollClient(Resource):
         
         data = request.json
         client_id = data.get('client_id')
+        client_ids = data.get('client_ids')
         program_ids = data.get('program_ids')
 
-        if not client_id or not program_ids:
+        # A single client_id or a whole cohort through client_ids
+        if client_ids is None and client_id:
+            client_ids = [client_id]
+
+        if not client_ids or not program_ids:
             return make_response({"error": "Client ID and Program IDs are required"}, 400)
 
-        # Check if clients table is empty
-        clients = Client.query.all()
-        if not clients:
-            return make_response({"error": "No clients available yet"}, 404)
-        # Fetch the client
-        client = Client.query.get(client_id)
-        if not client:
-            return make_response({"error": "Client not found"}, 404)
-
-        # Enroll the client in the specified programs
-        for program_id in program_ids:
-            program = HealthProgram.query.get(program_id)
-            if not program:
-                return make_response({"error": f"Program with ID {program_id} not found"}, 404)
-
-            # Check if the client is already enrolled in the program
-            existing_enrollment = Enrollment.query.filter_by(client_id=client_id, program_id=program_id).first()
-            if existing_enrollment:
-                # Skip if already enrolled
-                continue  
-
-            # Create a new enrollment
-            enrollment = Enrollment(client_id=client_id, program_id=program_id)
-            db.session.add(enrollment)
-
-        # Commit the changes
-        db.session.commit()
+        try:
+            client_ids = parse_ids(client_ids)
+            program_ids = parse_ids(program_ids)
+        except ValueError as e:
+            return make_response({"error": str(e)}, 400)
+
+        # Drop repeated ids but keep the order they were sent in
+        client_ids = list(dict.fromkeys(client_ids))
+        program_ids = list(dict.fromkeys(program_ids))
+
+        if len(client_ids) * len(program_ids) > current_app.config['ENROLL_MAX_PAIRS']:
+            return make_response({"error": f"Cannot enroll more than {current_app.config['ENROLL_MAX_PAIRS']} pairs at once"}, 400)
+
+        # Validate every id with one query per table
+        found_clients = {row.id for row in db.session.query(Client.id).filter(Client.id.in_(client_ids))}
+        missing_clients = [i for i in client_ids if i not in found_clients]
+        if missing_clients:
+            return make_response({"error": "Client not found", "missing_client_ids": missing_clients}, 404)
+
+        found_programs = {row.id for row in db.session.query(HealthProgram.id).filter(HealthProgram.id.in_(program_ids))}
+        missing_programs = [i for i in program_ids if i not in found_programs]
+        if missing_programs:
+            return make_response({
+                "error": f"Program with ID {missing_programs[0]} not found",
+                "missing_program_ids": missing_programs
+            }, 404)
+
+        try:
+            results = enroll_pairs(client_ids, program_ids)
+            commit_unless_batched()
+        except Exception as e:
+            db.session.rollback()
+            return make_response({"error": str(e)}, 500)
+
+        return make_response({
+            "message": "Client enrolled in programs successfully",
+            "enrolled": sum(1 for result in results if result['status'] == 'enrolled'),
+            "results": results
+        }, 201)
+        
+        
+# Bulk enrollment status changes, e.g. completing a program cycle
+class EnrollmentStatus(Resource):
+    @token_required
+    def post(self, current_user):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can change enrollment status"}, 403)
+        
+        data = request.json
+        status = data.get('status')
+        if status not in ENROLLMENT_TRANSITIONS:
+            return make_response({"error": f"Status must be one of {list(ENROLLMENT_TRANSITIONS)}"}, 400)
+        
+        # Enrollments are selected by program, by client list, by current status and by
+        # enrollment date. Every given filter applies; at least one of the first two is required.
+        program_ids = data.get('program_ids')
+        if program_ids is None and data.get('program_id') is not None:
+            program_ids = [data.get('program_id')]
+        client_ids = data.get('client_ids')
+        from_status = data.get('from_status')
+        
+        if not program_ids and not client_ids:
+            return make_response({"error": "Provide program_id, program_ids or client_ids"}, 400)
+        try:
+            program_ids = parse_ids(program_ids) if program_ids is not None else None
+            client_ids = parse_ids(client_ids) if client_ids is not None else None
+        except ValueError as e:
+            return make_response({"error": str(e)}, 400)
+        if len(client_ids or []) > current_app.config['ENROLL_MAX_PAIRS']:
+            return make_response({"error": f"Cannot update more than {current_app.config['ENROLL_MAX_PAIRS']} clients at once"}, 400)
+        if from_status is not None and status not in ENROLLMENT_TRANSITIONS.get(from_status, ()):
+            return make_response({"error": f"Cannot move enrollments from {from_status} to {status}"}, 400)
+        
+        criteria = []
+        if program_ids:
+            criteria.append(Enrollment.program_id.in_(program_ids))
+        if client_ids:
+            criteria.append(Enrollment.client_id.in_(client_ids))
+        if from_status is not None:
+            criteria.append(Enrollment.status == from_status)
+        try:
+            if data.get('enrolled_before'):
+                criteria.append(Enrollment.enrolled_at < datetime.datetime.strptime(data['enrolled_before'], "%Y-%m-%d"))
+            if data.get('enrolled_after'):
+                criteria.append(Enrollment.enrolled_at >= datetime.datetime.strptime(data['enrolled_after'], "%Y-%m-%d"))
+        except (TypeError, ValueError):
+            return make_response({"error": "Invalid date format. Expected format: YYYY-MM-DD"}, 400)
+        
+        try:
+            updated = transition_enrollments(status, *criteria)
+            commit_unless_batched()
+        except Exception as e:
+            db.session.rollback()
+            return make_response({"error": str(e)}, 500)
+        
+        return make_response({
+            "message": f"Enrollments marked {status}",
+            "status": status,
+            "updated": updated
+        }, 200)
+
+
+# A job as returned by the /jobs endpoints
+def job_data(job):
+    return dict(serialize_job(job), result_url=f"/jobs/{job.id}/result" if job.result_name else None)
+
+
+# Background jobs, run by `flask run-jobs` outside the request cycle
+class Jobs(Resource):
+    @token_required
+    def post(self, current_user):
+        if current_user.role != UserRole.DOCTOR:
+            return make_response({"error": "Only doctors can submit jobs"}, 403)
+        
+        # JSON {"kind", "params"}, or a multipart form with `kind`, the params and a `file`
+        upload = None
+        if request.mimetype == 'multipart/form-data':
+            params = request.form.to_dict()
+            kind = params.pop('kind', None)
+            if 'file' in request.files:
+                upload = request.files['file'].stream
+        else:
+            data = request.get_json(silent=True) or {}
+            kind, params = data.get('kind'), data.get('params') or {}
+        if not kind:
+            return make_response({"error": "Job kind is required"}, 400)
+        if not isinstance(params, dict):
+            return make_response({"error": "params must be an object"}, 400)
+        
+        active = db.session.query(func.count(Job.id)).filter(
+            Job.created_by == current_user.id, Job.status.in_(('queued', 'running'))
+        ).scalar()
+        if active >= current_app.config['JOB_MAX_ACTIVE_PER_USER']:
+            return make_response({"error": f"Cannot have more than {current_app.config['JOB_MAX_ACTIVE_PER_USER']} unfinished jobs"}, 429)
+        
+        try:
+            job = submit_job(kind, params, current_user.id, upload)
+        except JobError as e:
+            db.session.rollback()
+            return make_response({"error": str(e)}, 400)
+        
+        return make_response({"message": "Job queued", "job": job_data(job)}, 202)
+
+
+# Status and progress of one of the user's jobs
+class JobsById(Resource):
+    @token_required
+    def get(self, current_user, id):
+        job = db.session.get(Job, id)
+        if job is None or job.created_by != current_user.id:
+            return make_response({"error": "Job not found"}, 404)
+        
+        return make_response(job_data(job), 200)
+
+
+# Download what a finished job produced
+class JobResult(Resource):
+    @token_required
+    def get(self, current_user, id):
+        job = db.session.get(Job, id)
+        if job is None or job.created_by != current_user.id:
+            return make_response({"error": "Job not found"}, 404)
+        if job.status != 'succeeded' or not job.result_name:
+            return make_response({"error": f"Job is {job.status} and has no result"}, 409)
+        
+        path = job_file(job.id, job.result_name)
+        if not os.path.exists(path):
+            return make_response({"error": "Job result is no longer available"}, 410)
+        return send_file(path, mimetype=job.result_mimetype, as_attachment=True, download_name=job.result_name)
 
-        return make_response({"message": "Client enrolled in programs successfully"}, 201)
+
+# Several operations in one request and one transaction, e.g. registering a
+# client and enrolling them. Later operations can refer to earlier results.
+class Batch(Resource):
+    @token_required
+    def post(self, current_user):
+        data = request.json
+        operations = data.get('operations') if isinstance(data, dict) else None
         
+        if not isinstance(operations, list) or not operations:
+            return make_response({"error": "operations must be a non-empty list"}, 400)
+        if len(operations) > current_app.config['BATCH_MAX_OPERATIONS']:
+            return make_response({"error": f"Cannot run more than {current_app.config['BATCH_MAX_OPERATIONS']} operations at once"}, 400)
+        if not all(isinstance(operation, dict) and isinstance(operation.get('path'), str) for operation in operations):
+            return make_response({"error": "Every operation needs a path"}, 400)
         
+        status, body = run_batch(operations, current_user, BATCH_ENDPOINTS)
+        return make_response(body, status)
+
+
+# Resources a /batch operation may call
+BATCH_ENDPOINTS = {
+    resource.__name__.lower() for resource in (
+        Programs, ProgramsById, Clients, ClientsById, ClientSearch, ClientDuplicates,
+        EnrollClient, EnrollmentStatus
+    )
+}
+
+
 api.add_resource(AdminCheck, '/check-admin')
 api.add_resource(RegisterAdmin, "/register-admin")
 api.add_resource(Login, "/login")
+api.add_resource(Logout, "/logout")
 api.add_resource(RegisterDoctor, "/register-doctor")
 api.add_resource(Programs, "/programs")
 api.add_resource(ProgramsById, "/programs/<int:id>")
+api.add_resource(ProgramStats, "/programs/stats")
+api.add_resource(ProgramStatsById, "/programs/<int:id>/stats")
 api.add_resource(Clients, "/clients")
 api.add_resource(ClientsById, "/clients/<int:id>")
+api.add_resource(ClientImport, "/clients/import")
+api.add_resource(ClientExport, "/clients/export")
+api.add_resource(ClientSearch, "/clients/search")
+api.add_resource(ClientDuplicates, "/clients/duplicates")
+api.add_resource(Changes, "/changes")
 api.add_resource(EnrollClient, "/enroll-client")
+api.add_resource(EnrollmentStatus, "/enrollments/status")
+api.add_resource(Batch, "/batch")
+api.add_resource(Jobs, "/jobs")
+api.add_resource(JobsById, "/jobs/<int:id>")
+api.add_resource(JobResult, "/jobs/<int:id>/result")
         
     
-DEBUG_MODE = os.getenv("DEBUG_MODE") == "True"    
+# flask import-clients <file>
+@click.command('import-clients')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help="Defaults to the file extension")
+@click.option('--batch-size', default=None, type=int, help="Rows per insert batch")
+@with_appcontext
+def import_clients_command(path, fmt, batch_size):
+    """Import clients from a CSV or NDJSON file."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, encoding='utf-8', newline='') as stream:
+        for entry in import_clients(stream, fmt, batch_size or current_app.config['IMPORT_BATCH_SIZE']):
+            if 'summary' in entry:
+                click.echo(f"Imported {entry['summary']['imported']} clients, rejected {entry['summary']['rejected']}")
+            else:
+                click.echo(json.dumps(entry), err=True)
+
+
+# flask find-duplicates > duplicates.ndjson
+@click.command('find-duplicates')
+@click.option('--threshold', default=None, type=float, help="Minimum match score, 0 to 1")
+@click.option('--max-block', default=200, type=int, help="Skip blocking keys shared by more clients than this")
+@with_appcontext
+def find_duplicates_command(threshold, max_block):
+    """List likely duplicate clients as NDJSON."""
+    threshold = threshold if threshold is not None else current_app.config['DEDUPE_THRESHOLD']
+    for entry in iter_duplicate_pairs(threshold, max_block):
+        click.echo(json.dumps(entry))
+
+
+# flask run-jobs --workers 4
+@click.command('run-jobs')
+@click.option('--workers', default=None, type=int, help="Worker processes, defaults to JOB_WORKERS")
+@click.option('--burst', is_flag=True, help="Exit once no job is queued")
+@with_appcontext
+def run_jobs_command(workers, burst):
+    """Run queued background jobs on a pool of worker processes."""
+    run_workers(
+        workers or current_app.config['JOB_WORKERS'],
+        current_app.config['JOB_POLL_SECONDS'],
+        current_app.config['JOB_STALE_SECONDS'],
+        burst,
+        current_app.config['JOB_RESULT_TTL']
+    )
+
+
+# Settings read from the environment. Anything passed to create_app() wins.
+def load_config(app, overrides=None):
+    load_dotenv()
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+    app.config['REPLICA_WRITE_CACHE_SECONDS'] = float(os.getenv('REPLICA_WRITE_CACHE_SECONDS', 1))
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['JSON_PRETTY'] = os.getenv('JSON_PRETTY') == 'True'
+    app.config['PAGE_SIZE_DEFAULT'] = int(os.getenv('PAGE_SIZE_DEFAULT', 50))
+    app.config['PAGE_SIZE_MAX'] = int(os.getenv('PAGE_SIZE_MAX', 500))
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+    app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+    app.config['COMPRESS_BR_LEVEL'] = int(os.getenv('COMPRESS_BR_LEVEL', 4))
+    app.config['COMPRESS_ZSTD_LEVEL'] = int(os.getenv('COMPRESS_ZSTD_LEVEL', 3))
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 1024))
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+    app.config['ENROLL_MAX_PAIRS'] = int(os.getenv('ENROLL_MAX_PAIRS', 10000))
+    app.config['ENROLL_BATCH_SIZE'] = int(os.getenv('ENROLL_BATCH_SIZE', 1000))
+    app.config['IMPORT_BATCH_SIZE'] = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+    app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    app.config['BATCH_MAX_OPERATIONS'] = int(os.getenv('BATCH_MAX_OPERATIONS', 20))
+    app.config['DEDUPE_THRESHOLD'] = float(os.getenv('DEDUPE_THRESHOLD', 0.65))
+    app.config['DEDUPE_MAX_CANDIDATES'] = int(os.getenv('DEDUPE_MAX_CANDIDATES', 50))
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+    app.config['JOB_POLL_SECONDS'] = float(os.getenv('JOB_POLL_SECONDS', 1))
+    app.config['JOB_STALE_SECONDS'] = int(os.getenv('JOB_STALE_SECONDS', 300))
+    app.config['JOB_MAX_ACTIVE_PER_USER'] = int(os.getenv('JOB_MAX_ACTIVE_PER_USER', 10))
+    app.config['JOB_RESULT_DIR'] = os.getenv('JOB_RESULT_DIR', os.path.join(app.instance_path, 'jobs'))
+    # Seconds job files are kept; 0 keeps them until removed by hand
+    app.config['JOB_RESULT_TTL'] = int(os.getenv('JOB_RESULT_TTL', 7 * 24 * 3600))
+    app.config['CHANGE_FEED_LAG_SECONDS'] = int(os.getenv('CHANGE_FEED_LAG_SECONDS', 5))
+    # Requests issuing more SQL statements than this are logged; 0 turns the warning off
+    app.config['METRICS_QUERY_BUDGET'] = int(os.getenv('METRICS_QUERY_BUDGET', 20))
+    app.config.update(overrides or {})
+
+    # Connection pool and per-statement timeout, shared by the primary and the replica
+    pool_settings = dict(
+        pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        pool_pre_ping=os.getenv('DB_POOL_PRE_PING', 'True') == 'True',
+        statement_timeout=int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+    )
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI'], **pool_settings))
+    # Read-only GET endpoints go to DATABASE_REPLICA_URL when it is set
+    if os.getenv('DATABASE_REPLICA_URL'):
+        app.config.setdefault('SQLALCHEMY_BINDS', {REPLICA_BIND: dict(
+            url=os.getenv('DATABASE_REPLICA_URL'),
+            **engine_options(os.getenv('DATABASE_REPLICA_URL'), **pool_settings)
+        )})
+
+
+def create_app(config=None):
+    app = Flask(__name__, static_url_path='')
+    CORS(app, origins=["http://localhost:5173","https://his-frontend.onrender.com"])
+    load_config(app, config)
+
+    # Compact orjson-backed JSON unless JSON_PRETTY=True
+    app.json = FastJSONProvider(app)
+    app.json.compact = not app.config['JSON_PRETTY']
+    token_versions.maxsize = app.config['USER_CACHE_SIZE']
+    token_versions.ttl = app.config['USER_CACHE_TTL']
+
+    # Initialize the database and bcrypt
+    db.init_app(app)
+    # Flask-Migrate imports Alembic, which only the `flask` CLI needs; workers skip it
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    bcrypt.init_app(app)
+    password_hasher.init_app(app)
+    Compress(app)
+    metrics.init_app(app)
+    ReplicaRouting(app)
+    api.init_app(app)
+
+    app.add_url_rule("/", view_func=index)
+    app.add_url_rule("/metrics", view_func=metrics_endpoint)
+    app.cli.add_command(import_clients_command)
+    app.cli.add_command(find_duplicates_command)
+    app.cli.add_command(run_jobs_command)
+    return app
+
 
 if __name__ == "__main__":
+    app = create_app()
+    # Read after create_app(), which loads .env
+    debug_mode = os.getenv("DEBUG_MODE") == "True"
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", debug=DEBUG_MODE, port=port)
\ No newline at end of file
+    app.run(host="0.0.0.0", debug=debug_mode, port=port)
\ No newline at end of file
@@ -0,0 +1,128 @@
+import re
+from flask import current_app, g
+from flask.globals import request_ctx
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from models import db
+
+
+class BatchError(ValueError):
+    pass
+
+
+# Commit the request's work. Inside a batch the work is only flushed, so ids
+# are assigned, and the batch commits once after every operation succeeded.
+def commit_unless_batched():
+    if g.get('batch_user') is not None:
+        db.session.flush()
+    else:
+        db.session.commit()
+
+
+# Value at "$<op>.<key>.<key>..." in an earlier result, where <op> is an
+# operation's id or index and the keys walk its response body
+def lookup(reference, results):
+    name, *keys = reference[1:].split('.')
+    result = results.get(name)
+    if result is None:
+        raise BatchError(f"Unknown reference {reference}")
+    value = result['body']
+    for key in keys:
+        try:
+            value = value[int(key)] if isinstance(value, list) else value[key]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise BatchError(f"Unknown reference {reference}")
+    return value
+
+
+# "$<op>" or "$<op>.<key>...": no spaces, and <op> does not start with "$"
+REFERENCE = re.compile(r"\$[^\s.$][^\s.]*(\.[^\s.]+)*")
+
+
+# Replace every string of the form "$<op>.<path>" in `value` by what it points at.
+# Other strings are kept as they are; a leading "$$" stands for a literal "$",
+# e.g. "$$5.00" for the text "$5.00".
+def resolve(value, results):
+    if isinstance(value, str):
+        if value.startswith('$$'):
+            return value[1:]
+        if REFERENCE.fullmatch(value):
+            return lookup(value, results)
+        return value
+    if isinstance(value, dict):
+        return {key: resolve(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, results) for item in value]
+    return value
+
+
+def resolve_path(path, results):
+    path, _, query = path.partition('?')
+    segments = [str(resolve(segment, results)) for segment in path.split('/')]
+    return '/'.join(segments) + (f"?{query}" if query else '')
+
+
+# Run one operation through the view that serves it. The sub-request takes
+# the place of the batch request on the current request context, so it
+# shares the batch's session, transaction and `g` and no request hooks run.
+def dispatch(method, path, body, endpoints):
+    builder = EnvironBuilder(path=path, method=method, json=body, headers={'Accept': 'application/json'})
+    try:
+        sub_request = current_app.request_class(builder.get_environ())
+    finally:
+        builder.close()
+
+    try:
+        rule, view_args = current_app.url_map.bind_to_environ(sub_request.environ).match(return_rule=True)
+    except HTTPException:
+        raise BatchError(f"No operation for {method} {path}")
+    if rule.endpoint not in endpoints:
+        raise BatchError(f"{method} {rule.rule} cannot be batched")
+    sub_request.url_rule, sub_request.view_args = rule, view_args
+
+    context = request_ctx._get_current_object()
+    outer_request, context.request = context.request, sub_request
+    try:
+        response = current_app.make_response(current_app.view_functions[rule.endpoint](**view_args))
+    except HTTPException as e:
+        return e.code, {"error": e.description}
+    finally:
+        context.request = outer_request
+    return response.status_code, response.get_json(silent=True)
+
+
+# Run `operations` in order as `user`, in one transaction. Stops at the first
+# operation that fails and rolls everything back. Returns the status for the
+# whole batch and the results so far.
+def run_batch(operations, user, endpoints):
+    results, by_name = [], {}
+    g.batch_user = user
+    g.read_primary = True
+    try:
+        for index, operation in enumerate(operations):
+            name = str(operation.get('id', index))
+            try:
+                method = str(operation.get('method', 'GET')).upper()
+                path = resolve_path(operation['path'], by_name)
+                status, body = dispatch(method, path, resolve(operation.get('body'), by_name), endpoints)
+            except BatchError as e:
+                status, body = 400, {"error": str(e)}
+            except Exception as e:
+                status, body = 500, {"error": str(e)}
+
+            result = {"id": name, "status": status, "body": body}
+            results.append(result)
+            by_name[name] = by_name[str(index)] = result
+            if status >= 400:
+                db.session.rollback()
+                return status, {"error": f"Operation {name} failed", "failed": name, "results": results}
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return 500, {"error": str(e), "results": results}
+    finally:
+        g.pop('batch_user', None)
+        g.pop('read_primary', None)
+
+    return 200, {"results": results}
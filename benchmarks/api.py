@@ -0,0 +1,484 @@
+"""End-to-end API benchmark: latency percentiles and throughput per endpoint.
+
+Migrates and fills a database with `seed.py generate`, starts the app in a
+separate process and drives every route registered with `api.add_resource`
+from concurrent authenticated clients. Results are written as JSON so runs
+can be compared and regressions flagged.
+
+    python benchmarks/api.py run --clients 100000 --output results.json
+    python benchmarks/api.py run --database-url postgresql://localhost/his_bench --reuse
+    python benchmarks/api.py compare baseline.json results.json --threshold 0.15
+"""
+import argparse
+import csv
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'password123'  # shared by every user seed.py generates
+NAME_PREFIXES = ('jo', 'mar', 'an', 'da', 'li', 'ro', 'el', 'ch', 'sa', 'mi')
+
+
+# A client of the app under test. One connection per request keeps the
+# numbers comparable between servers with and without keep-alive.
+class Client:
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+
+    def request(self, method, path, body=None, headers=None, content_type='application/json'):
+        headers = dict(headers or {})
+        if body is not None:
+            if not isinstance(body, (bytes, str)):
+                body = json.dumps(body)
+            headers['Content-Type'] = content_type
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=300)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            return response.status, data
+        finally:
+            connection.close()
+
+    def login(self, email):
+        status, data = self.request('POST', '/login', {'email': email, 'password': PASSWORD})
+        if status != 200:
+            raise RuntimeError(f"Login as {email} failed with {status}: {data[:200]!r}")
+        return {'Authorization': f"Bearer {json.loads(data)['token']}"}
+
+
+# What the benchmark knows about the dataset, plus counters for unique names
+class Context:
+    def __init__(self, client, clients, programs, doctors, run_id):
+        self.client = client
+        self.clients = clients
+        self.programs = programs
+        self.doctors = doctors
+        self.run_id = run_id
+        self.admin = client.login('admin@example.com')
+        self.doctor = client.login('doctor2@example.com')
+        self._counter = iter(range(1, sys.maxsize))
+        self._lock = threading.Lock()
+        self._job_lock = threading.Lock()
+        self._job_owner = None
+
+    def unique(self):
+        with self._lock:
+            return f"{self.run_id}-{next(self._counter)}"
+
+    def client_id(self, rng):
+        return rng.randint(1, self.clients)
+
+    def program_id(self, rng):
+        return rng.randint(1, self.programs)
+
+    # A doctor registered for this run, holding one queued job, so the job
+    # scenarios are not capped by unfinished jobs left by earlier runs.
+    # Returns (headers, job id).
+    def job_owner(self):
+        with self._job_lock:
+            if self._job_owner is None:
+                status, data = self.client.request('POST', *register_doctor(None, self)[1:])
+                if status != 201:
+                    raise RuntimeError(f"Registering a doctor failed with {status}: {data[:200]!r}")
+                headers = self.client.login(json.loads(data)['doctor']['email'])
+                status, data = self.client.request('POST', '/jobs', {'kind': 'find_duplicates'}, headers)
+                if status != 202:
+                    raise RuntimeError(f"Submitting a job failed with {status}: {data[:200]!r}")
+                self._job_owner = (headers, json.loads(data)['job']['id'])
+            return self._job_owner
+
+
+def random_client(rng, ctx):
+    return {
+        'full_name': f"Bench Client {ctx.unique()}",
+        'phone': f"07{rng.randrange(10 ** 8):08d}",
+        'address': 'Nairobi',
+        'date_of_birth': f"{rng.randint(1940, 2020)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'gender': rng.choice(('Female', 'Male', 'Other'))
+    }
+
+
+def import_body(rng, ctx, rows=50):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=('full_name', 'phone', 'address', 'date_of_birth', 'gender'))
+    writer.writeheader()
+    writer.writerows(random_client(rng, ctx) for _ in range(rows))
+    return buffer.getvalue()
+
+
+def register_doctor(rng, ctx):
+    unique = ctx.unique()
+    body = {'username': f"bench-{unique}", 'email': f"bench-{unique}@example.com", 'password': PASSWORD}
+    return 'POST', '/register-doctor', body, ctx.admin
+
+
+def logout(rng, ctx):
+    # Logging out revokes every token the user holds, so each request first
+    # registers and logs in a throwaway doctor (untimed) and logs them out
+    status, data = ctx.client.request('POST', *register_doctor(rng, ctx)[1:])
+    if status != 201:
+        raise RuntimeError(f"Registering a doctor failed with {status}: {data[:200]!r}")
+    headers = ctx.client.login(json.loads(data)['doctor']['email'])
+    return 'POST', '/logout', None, headers
+
+
+def search_query(rng, ctx):
+    kind = rng.randrange(3)
+    if kind == 0:
+        return f"q={rng.choice(NAME_PREFIXES)}"
+    if kind == 1:
+        return f"phone=07{rng.randrange(10 ** 8):08d}"
+    year = rng.randint(1940, 2020)
+    return f"dob_from={year}-01-01&dob_to={year}-12-31"
+
+
+def duplicates_query(rng, ctx):
+    client = random_client(rng, ctx)
+    client['full_name'] = f"{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_PREFIXES)}"
+    return urlencode({key: client[key] for key in ('full_name', 'phone', 'date_of_birth')})
+
+
+# One scenario per "METHOD rule". Each builds a request from a seeded random
+# generator and lists the statuses that count as success; `share` scales the
+# request count for endpoints that are much slower by design.
+SCENARIOS = {
+    'GET /check-admin': dict(
+        build=lambda rng, ctx: ('GET', '/check-admin', None, None)),
+    'POST /register-admin': dict(
+        build=lambda rng, ctx: ('POST', '/register-admin', {}, None),
+        expect=(403,)),
+    'POST /login': dict(
+        build=lambda rng, ctx: ('POST', '/login', {'email': 'doctor2@example.com', 'password': PASSWORD}, None),
+        share=0.25),
+    'POST /logout': dict(build=logout, share=0.25),
+    'POST /register-doctor': dict(build=register_doctor, expect=(201,), share=0.25),
+    'GET /programs': dict(
+        build=lambda rng, ctx: ('GET', '/programs?enrollment_limit=20', None, ctx.doctor)),
+    'POST /programs': dict(
+        build=lambda rng, ctx: ('POST', '/programs', {'name': f"Bench Program {ctx.unique()}"}, ctx.doctor),
+        expect=(201,)),
+    'GET /programs/<int:id>': dict(
+        build=lambda rng, ctx: ('GET', f"/programs/{ctx.program_id(rng)}?limit=50", None, ctx.doctor)),
+    'GET /programs/stats': dict(
+        build=lambda rng, ctx: ('GET', '/programs/stats', None, ctx.doctor), share=0.25),
+    'GET /programs/<int:id>/stats': dict(
+        build=lambda rng, ctx: ('GET', f"/programs/{ctx.program_id(rng)}/stats", None, ctx.doctor)),
+    'GET /clients': dict(
+        build=lambda rng, ctx: ('GET', f"/clients?limit=50&after={ctx.client_id(rng) - 1}"
+                                       f"{'&min_age=50&max_age=65&sort=age' if rng.random() < 0.25 else ''}",
+                                None, ctx.doctor)),
+    'POST /clients': dict(
+        build=lambda rng, ctx: ('POST', '/clients', random_client(rng, ctx), ctx.doctor),
+        expect=(201,)),
+    'GET /clients/<int:id>': dict(
+        build=lambda rng, ctx: ('GET', f"/clients/{ctx.client_id(rng)}", None, None)),
+    'POST /clients/import': dict(
+        build=lambda rng, ctx: ('POST', '/clients/import?format=csv', import_body(rng, ctx), ctx.doctor),
+        content_type='text/csv', share=0.25),
+    'GET /clients/export': dict(
+        build=lambda rng, ctx: ('GET', '/clients/export', None, ctx.doctor),
+        share=0.02),
+    'GET /changes': dict(
+        build=lambda rng, ctx: ('GET', '/changes?limit=200&since=2000-01-01T00:00:00', None, ctx.doctor)),
+    'GET /clients/search': dict(
+        build=lambda rng, ctx: ('GET', f"/clients/search?{search_query(rng, ctx)}", None, ctx.doctor)),
+    'GET /clients/duplicates': dict(
+        build=lambda rng, ctx: ('GET', f"/clients/duplicates?{duplicates_query(rng, ctx)}", None, ctx.doctor)),
+    'POST /enroll-client': dict(
+        build=lambda rng, ctx: ('POST', '/enroll-client', {
+            'client_id': ctx.client_id(rng),
+            'program_ids': sorted({ctx.program_id(rng) for _ in range(2)})
+        }, ctx.doctor),
+        expect=(201,)),
+    'POST /batch': dict(
+        build=lambda rng, ctx: ('POST', '/batch', {'operations': [
+            {'id': 'client', 'method': 'POST', 'path': '/clients', 'body': random_client(rng, ctx)},
+            {'method': 'POST', 'path': '/enroll-client', 'body': {
+                'client_id': '$client.client.id',
+                'program_ids': sorted({ctx.program_id(rng) for _ in range(2)})
+            }}
+        ]}, ctx.doctor),
+        share=0.25),
+    # No job worker runs during the benchmark, so jobs stay queued: submissions
+    # hit the per-user cap and results are not ready yet
+    'POST /jobs': dict(
+        build=lambda rng, ctx: ('POST', '/jobs', {'kind': 'find_duplicates', 'params': {'threshold': 0.9}},
+                                ctx.job_owner()[0]),
+        expect=(202, 429), share=0.25),
+    'GET /jobs/<int:id>': dict(
+        build=lambda rng, ctx: ('GET', f"/jobs/{ctx.job_owner()[1]}", None, ctx.job_owner()[0])),
+    'GET /jobs/<int:id>/result': dict(
+        build=lambda rng, ctx: ('GET', f"/jobs/{ctx.job_owner()[1]}/result", None, ctx.job_owner()[0]),
+        expect=(409,)),
+    'POST /enrollments/status': dict(
+        build=lambda rng, ctx: ('POST', '/enrollments/status', {
+            'status': rng.choice(('dropped', 'active')),
+            'client_ids': [ctx.client_id(rng) for _ in range(20)]
+        }, ctx.doctor)),
+}
+
+
+# Every "METHOD rule" registered through api.add_resource
+def registered_endpoints():
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    sys.path.insert(0, ROOT)
+    from app import create_app, api
+
+    app = create_app()
+    endpoints = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint not in api.endpoints:
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            endpoints.append(f"{method} {rule.rule}")
+    return endpoints
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)  # noqa: E731
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'mean_ms': ms(statistics.fmean(latencies)),
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1]),
+    }
+
+
+# Send `requests` requests for one scenario from `concurrency` workers
+def run_scenario(ctx, scenario, requests, concurrency, warmup, seed):
+    expect = scenario.get('expect', (200,))
+    content_type = scenario.get('content_type', 'application/json')
+    lock = threading.Lock()
+    latencies, statuses, errors = [], {}, 0
+
+    def one(index, record=True):
+        nonlocal errors
+        rng = random.Random(seed * 1000003 + index)
+        method, path, body, headers = scenario['build'](rng, ctx)
+        started = time.perf_counter()
+        try:
+            status, _ = ctx.client.request(method, path, body, headers, content_type)
+        except OSError:
+            status = 'connection-error'
+        elapsed = time.perf_counter() - started
+        if record:
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status not in expect:
+                    errors += 1
+
+    for index in range(warmup):
+        one(-1 - index, record=False)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - started)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(args, env):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade'],
+                   cwd=ROOT, env=env, check=True)
+    if not args.reuse:
+        subprocess.run([
+            sys.executable, 'seed.py', 'generate',
+            '--clients', str(args.clients), '--programs', str(args.programs),
+            '--doctors', str(args.doctors), '--seed', str(args.seed)
+        ], cwd=ROOT, env=env, check=True)
+
+
+def start_server(args, env):
+    port = free_port()
+    if args.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}",
+                   '--workers', str(args.workers), '--threads', str(args.threads), 'app:create_app()']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port),
+                   '--with-threads', '--no-reload', '--no-debugger']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    base_url = f"http://127.0.0.1:{port}"
+    client = Client(base_url)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited: {process.stderr.read().decode()[-2000:]}")
+        try:
+            client.request('GET', '/')
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 60s")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    endpoints = registered_endpoints()
+    uncovered = [endpoint for endpoint in endpoints if endpoint not in SCENARIOS]
+    for endpoint in uncovered:
+        print(f"warning: no scenario for {endpoint}", file=sys.stderr)
+    selected = [endpoint for endpoint in endpoints if endpoint in SCENARIOS
+                and (not args.endpoints or any(name in endpoint for name in args.endpoints))]
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'his-benchmark.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url,
+               SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark-secret-key'))
+
+    process = None
+    if args.url:
+        base_url = args.url
+    else:
+        prepare_database(args, env)
+        process, base_url = start_server(args, env)
+
+    try:
+        ctx = Context(Client(base_url), args.clients, args.programs, args.doctors,
+                      run_id=datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S'))
+        results = {}
+        for endpoint in selected:
+            scenario = SCENARIOS[endpoint]
+            requests = max(1, round(args.requests * scenario.get('share', 1)))
+            result = run_scenario(ctx, scenario, requests, args.concurrency, args.warmup, args.seed)
+            results[endpoint] = result
+            print(f"{endpoint:<32}{result['requests']:>6} req {result['throughput_rps']:>9.1f} req/s  "
+                  f"p50 {result['p50_ms']:>8.1f}  p95 {result['p95_ms']:>8.1f}  p99 {result['p99_ms']:>8.1f} ms"
+                  f"{'  errors ' + str(result['errors']) if result['errors'] else ''}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        'meta': {
+            'started_at': ctx.run_id,
+            'revision': git_revision(),
+            'database': urlsplit(database_url).scheme.split('+')[0] if not args.url else None,
+            'server': 'external' if args.url else args.server,
+            'clients': args.clients,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'seed': args.seed,
+            'python': platform.python_version(),
+        },
+        'results': results,
+        'uncovered': uncovered,
+    }
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Results written to {args.output}")
+
+    failed = any(result['errors'] for result in results.values())
+    if args.baseline:
+        with open(args.baseline) as handle:
+            failed = report_regressions(json.load(handle), report, args.threshold) or failed
+    return 1 if failed else 0
+
+
+# Endpoints whose p95 latency rose or throughput fell by more than `threshold`
+def find_regressions(baseline, current, threshold):
+    regressions = []
+    for endpoint, result in current['results'].items():
+        before = baseline['results'].get(endpoint)
+        if not before:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append((endpoint, 'p95_ms', before['p95_ms'], result['p95_ms']))
+        if result['throughput_rps'] < before['throughput_rps'] * (1 - threshold):
+            regressions.append((endpoint, 'throughput_rps', before['throughput_rps'], result['throughput_rps']))
+    return regressions
+
+
+def report_regressions(baseline, current, threshold):
+    regressions = find_regressions(baseline, current, threshold)
+    for endpoint, metric, before, after in regressions:
+        print(f"REGRESSION {endpoint}: {metric} {before} -> {after}")
+    if not regressions:
+        print(f"No regressions beyond {threshold:.0%}")
+    return bool(regressions)
+
+
+def compare(args):
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    return 1 if report_regressions(baseline, current, args.threshold) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the benchmark")
+    run_parser.add_argument('--database-url', help="Defaults to a SQLite file in the temp directory")
+    run_parser.add_argument('--url', help="Benchmark an already running server instead of starting one")
+    run_parser.add_argument('--reuse', action='store_true', help="Keep the existing data instead of regenerating it")
+    run_parser.add_argument('--clients', type=int, default=100000)
+    run_parser.add_argument('--programs', type=int, default=20)
+    run_parser.add_argument('--doctors', type=int, default=10)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--server', choices=('flask', 'gunicorn'), default='flask')
+    run_parser.add_argument('--workers', type=int, default=4, help="gunicorn workers")
+    run_parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint")
+    run_parser.add_argument('--warmup', type=int, default=5, help="Untimed requests per endpoint")
+    run_parser.add_argument('--endpoints', nargs='*', help="Only endpoints containing one of these strings")
+    run_parser.add_argument('--output', help="Write results to this JSON file")
+    run_parser.add_argument('--baseline', help="Compare against an earlier results file")
+    run_parser.add_argument('--threshold', type=float, default=0.10)
+
+    compare_parser = commands.add_parser('compare', help="Compare two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10)
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == 'run' else compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Microbenchmark: ORM objects + reflective to_dict + pretty JSON versus
+column tuples + precompiled serializers + the app's JSON provider.
+
+The "orm" path walks each object's mapped columns the way SerializerMixin
+did, without its rule parsing, so it understates the old cost.
+
+    python benchmarks/serialization.py --clients 20000 --enrollments 3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, inspect  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+from app import create_app, enrollments_by_client  # noqa: E402
+from models import db, User, UserRole, HealthProgram, Client, Enrollment  # noqa: E402
+from serializers import columns, serialize_client, CLIENT_FIELDS  # noqa: E402
+
+# Always a private in-memory database, whatever DATABASE_URL points at
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'SQLALCHEMY_BINDS': {}})
+
+
+def populate(n_clients, per_client):
+    now = datetime.now(timezone.utc)
+    db.session.execute(insert(User), [{
+        'username': 'bench', 'email': 'bench@example.com', 'password_hash': 'x' * 60, 'role': UserRole.DOCTOR
+    }])
+    db.session.execute(insert(HealthProgram), [{'name': f'Program {i}', 'created_by': 1} for i in range(1, 11)])
+    db.session.execute(insert(Client), [{
+        'full_name': f'Client {i}', 'phone': '0712345678', 'address': 'Nairobi',
+        'date_of_birth': date(1950 + i % 50, 1 + i % 12, 1 + i % 28), 'gender': 'Female',
+        'created_at': now, 'updated_at': now
+    } for i in range(n_clients)])
+    rows = []
+    for client_id in range(1, n_clients + 1):
+        for program_id in random.sample(range(1, 11), per_client):
+            rows.append({'client_id': client_id, 'program_id': program_id, 'enrolled_at': now, 'updated_at': now, 'status': 'active'})
+    db.session.execute(insert(Enrollment), rows)
+    db.session.commit()
+
+
+def _format(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+
+# Reflective serialization in the style of SerializerMixin.to_dict
+def reflective_dict(obj):
+    return {attr.key: _format(getattr(obj, attr.key)) for attr in inspect(obj).mapper.column_attrs}
+
+
+def orm_path():
+    clients = Client.query.options(
+        selectinload(Client.enrollments).joinedload(Enrollment.program)
+    ).order_by(Client.id).all()
+    started = time.perf_counter()
+    data = []
+    for client in clients:
+        client_data = reflective_dict(client)
+        client_data['enrollments'] = [dict(
+            reflective_dict(enrollment),
+            client_name=client.full_name,
+            program_name=enrollment.program.name
+        ) for enrollment in client.enrollments]
+        data.append(client_data)
+    serialized = time.perf_counter()
+    body = json.dumps(data, indent=2, sort_keys=True)
+    return serialized - started, time.perf_counter() - serialized, len(body)
+
+
+def tuple_path():
+    clients = db.session.query(*columns(Client, CLIENT_FIELDS)).order_by(Client.id).all()
+    enrollments = enrollments_by_client([client.id for client in clients])
+    started = time.perf_counter()
+    data = []
+    for client in clients:
+        client_data = serialize_client(client)
+        client_data['enrollments'] = enrollments[client.id]
+        data.append(client_data)
+    serialized = time.perf_counter()
+    body = app.json.dumps(data)
+    return serialized - started, time.perf_counter() - serialized, len(body)
+
+
+def best_of(fn, repeat):
+    results = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        serialize, encode, size = fn()
+        results.append((time.perf_counter() - started, serialize, encode, size))
+    return min(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=20000)
+    parser.add_argument('--enrollments', type=int, default=3, help="Enrollments per client (max 10)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    with app.app_context():
+        db.create_all()
+        populate(args.clients, min(args.enrollments, 10))
+        print(f"{args.clients} clients, {args.clients * min(args.enrollments, 10)} enrollments, best of {args.repeat}")
+        print(f"{'path':<8}{'total s':>10}{'serialize s':>14}{'encode s':>11}{'bytes':>12}")
+        for name, fn in (('orm', orm_path), ('tuples', tuple_path)):
+            total, serialize, encode, size = best_of(fn, args.repeat)
+            print(f"{name:<8}{total:>10.3f}{serialize:>14.3f}{encode:>11.3f}{size:>12}")
+
+
+if __name__ == "__main__":
+    main()
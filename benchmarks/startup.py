@@ -0,0 +1,118 @@
+"""Startup benchmark: how long a fresh worker takes to import and build the app.
+
+Each run is a new interpreter, so nothing is cached between runs. Results
+are written as JSON so runs can be compared and regressions flagged.
+
+    python benchmarks/startup.py run --runs 20 --output startup.json
+    python benchmarks/startup.py compare baseline.json startup.json --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the app should only import when they are actually used
+LAZY_MODULES = ('alembic', 'flask_migrate', 'faker', 'flask_admin')
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'modules': len(sys.modules),
+    'lazy_loaded': [name for name in {LAZY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(runs):
+    env = dict(os.environ, DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite://'))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+    return samples
+
+
+def summarize(samples):
+    result = {}
+    for key in ('import_ms', 'create_app_ms'):
+        values = sorted(sample[key] for sample in samples)
+        result[key] = {
+            'median': round(statistics.median(values), 2),
+            'min': round(values[0], 2),
+            'max': round(values[-1], 2),
+        }
+    result['total_ms'] = round(result['import_ms']['median'] + result['create_app_ms']['median'], 2)
+    result['modules'] = samples[-1]['modules']
+    result['lazy_loaded'] = samples[-1]['lazy_loaded']
+    return result
+
+
+def run(args):
+    result = summarize(measure(args.runs))
+    print(f"import {result['import_ms']['median']:.1f} ms  create_app {result['create_app_ms']['median']:.1f} ms  "
+          f"({result['modules']} modules, median of {args.runs} runs)")
+    if result['lazy_loaded']:
+        print(f"warning: loaded at startup: {', '.join(result['lazy_loaded'])}", file=sys.stderr)
+
+    report = {'meta': {'runs': args.runs, 'python': platform.python_version()}, 'result': result}
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as handle:
+            return 1 if report_regression(json.load(handle), report, args.threshold) else 0
+    return 0
+
+
+def report_regression(baseline, current, threshold):
+    before, after = baseline['result']['total_ms'], current['result']['total_ms']
+    if after > before * (1 + threshold):
+        print(f"REGRESSION startup: total_ms {before} -> {after}")
+        return True
+    print(f"No regression beyond {threshold:.0%} ({before} -> {after} ms)")
+    return False
+
+
+def compare(args):
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    return 1 if report_regression(baseline, current, args.threshold) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Measure startup time")
+    run_parser.add_argument('--runs', type=int, default=10)
+    run_parser.add_argument('--output', help="Write results to this JSON file")
+    run_parser.add_argument('--baseline', help="Compare against an earlier results file")
+    run_parser.add_argument('--threshold', type=float, default=0.15)
+
+    compare_parser = commands.add_parser('compare', help="Compare two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.15)
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == 'run' else compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_
+from models import db, utcnow, Client, Enrollment, HealthProgram
+from serializers import columns, serialize_client, serialize_enrollment, CLIENT_FIELDS, DATETIME_FORMAT
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# The cursor holds the last (updated_at, id) returned from each table,
+# base64-encoded so callers treat it as opaque
+def encode_cursor(positions):
+    data = {key: [updated_at.isoformat(), row_id] for key, (updated_at, row_id) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {key: (datetime.fromisoformat(updated_at), int(row_id)) for key, (updated_at, row_id) in data.items()}
+    except (ValueError, TypeError, AttributeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+# Rows of `model` changed after `position` and no later than `until`, in
+# (updated_at, id) order so the (updated_at, id) index serves the scan
+def changed_after(query, model, position, until, limit):
+    query = query.filter(model.updated_at <= until)
+    if position is not None:
+        query = query.filter(tuple_(model.updated_at, model.id) > position)
+    return query.order_by(model.updated_at, model.id).limit(limit + 1).all()
+
+
+# Clients and enrollments changed since `cursor`, up to `limit` of each.
+#
+# Rows stamped in the last `lag` seconds are held back. A transaction can
+# commit after a later-stamped one, and without the lag a reader could move
+# its cursor past rows that are not visible yet.
+def changes_since(cursor=None, since=None, limit=500, lag=5):
+    positions = decode_cursor(cursor) if cursor else {}
+    if since is not None:
+        # Start just before `since`; ids are positive so (since, 0) sorts first
+        positions = {'clients': (since, 0), 'enrollments': (since, 0)}
+    until = utcnow() - timedelta(seconds=lag)
+
+    clients = changed_after(
+        db.session.query(*columns(Client, CLIENT_FIELDS)),
+        Client, positions.get('clients'), until, limit
+    )
+    enrollments = changed_after(
+        db.session.query(
+            Enrollment.id,
+            Enrollment.client_id,
+            Enrollment.program_id,
+            Client.full_name.label('client_name'),
+            HealthProgram.name.label('program_name'),
+            Enrollment.enrolled_at,
+            Enrollment.status,
+            Enrollment.updated_at
+        ).join(
+            Client, Client.id == Enrollment.client_id
+        ).join(
+            HealthProgram, HealthProgram.id == Enrollment.program_id
+        ),
+        Enrollment, positions.get('enrollments'), until, limit
+    )
+
+    has_more = len(clients) > limit or len(enrollments) > limit
+    clients, enrollments = clients[:limit], enrollments[:limit]
+    if clients:
+        positions['clients'] = (clients[-1].updated_at, clients[-1].id)
+    if enrollments:
+        positions['enrollments'] = (enrollments[-1].updated_at, enrollments[-1].id)
+
+    return {
+        "clients": [serialize_client(client) for client in clients],
+        "enrollments": [
+            dict(serialize_enrollment(enrollment), updated_at=enrollment.updated_at.strftime(DATETIME_FORMAT))
+            for enrollment in enrollments
+        ],
+        "next_cursor": encode_cursor(positions) if positions else None,
+        "has_more": has_more
+    }
@@ -0,0 +1,102 @@
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+DEFAULT_MIMETYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'text/csv',
+    'text/html',
+    'text/plain',
+)
+
+
+# Compresses responses in the best encoding the client accepts. Buffered
+# bodies below COMPRESS_MIN_SIZE are sent as they are; streamed bodies are
+# compressed and flushed chunk by chunk as they are produced.
+class Compress:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+        app.config.setdefault('COMPRESS_ZSTD_LEVEL', 3)
+        app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+        app.config.setdefault('COMPRESS_ALGORITHMS', ('zstd', 'br', 'gzip'))
+
+        self.config = app.config
+        self.algorithms = [
+            name for name in app.config['COMPRESS_ALGORITHMS']
+            if name == 'gzip' or (name == 'br' and brotli) or (name == 'zstd' and zstandard)
+        ]
+        app.after_request(self.after_request)
+
+    # (compress, flush, finish) for `encoding`. flush() emits everything
+    # compressed so far, so a streamed chunk reaches the client when it is produced.
+    def compressor(self, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.config['COMPRESS_BR_LEVEL'])
+            return compressor.process, compressor.flush, compressor.finish
+        if encoding == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=self.config['COMPRESS_ZSTD_LEVEL']).compressobj()
+            return compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), compressor.flush
+        # wbits=31 writes a gzip header and trailer
+        compressor = zlib.compressobj(self.config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+        return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+    def after_request(self, response):
+        response.vary.add('Accept-Encoding')
+
+        if (request.method == 'HEAD'
+                or response.status_code < 200
+                or response.status_code in (204, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.cache_control.no_transform
+                or response.mimetype not in self.config['COMPRESS_MIMETYPES']):
+            return response
+
+        encoding = request.accept_encodings.best_match(self.algorithms)
+        if encoding is None:
+            return response
+
+        compress, flush, finish = self.compressor(encoding)
+        if response.is_streamed:
+            chunks = response.response
+
+            def stream():
+                try:
+                    for chunk in chunks:
+                        if not chunk:
+                            continue
+                        data = compress(chunk.encode() if isinstance(chunk, str) else chunk) + flush()
+                        if data:
+                            yield data
+                    yield finish()
+                finally:
+                    if hasattr(chunks, 'close'):
+                        chunks.close()
+
+            response.response = stream()
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(compress(body) + finish())
+
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,82 @@
+import hashlib
+from datetime import timezone
+from flask import request, make_response
+from sqlalchemy import func
+from models import db, Client, Enrollment, HealthProgram
+
+
+# Validators are (last_modified, *version parts) tuples read with a single
+# query. Inserts move the max ids and updates move updated_at; the API has no
+# deletes, so counts are only taken where they are cheap. Each maximum is a
+# scalar subquery of its own, which reads one entry at the end of an index;
+# several maxima in one SELECT would scan the whole index instead.
+
+def client_validators(client_id):
+    return db.session.query(
+        Client.updated_at,
+        func.max(Enrollment.updated_at),
+        func.max(Enrollment.id),
+        func.count(Enrollment.id)
+    ).outerjoin(
+        Enrollment, Enrollment.client_id == Client.id
+    ).filter(Client.id == client_id).group_by(Client.id, Client.updated_at).first()
+
+
+def clients_validators():
+    return tuple(db.session.query(
+        db.session.query(func.max(Client.updated_at)).scalar_subquery(),
+        db.session.query(func.max(Client.id)).scalar_subquery(),
+        db.session.query(func.max(Enrollment.updated_at)).scalar_subquery(),
+        db.session.query(func.max(Enrollment.id)).scalar_subquery()
+    ).one())
+
+
+def programs_validators():
+    programs = db.session.query(func.max(HealthProgram.id)).scalar()
+    return (programs,) + clients_validators()
+
+
+# Maxima over the program's enrollments only, read from the (program_id,
+# updated_at) and (program_id, id) indexes; clients are never updated
+# through the API, so their rows need not be looked at.
+def program_validators(program_id):
+    return db.session.query(
+        HealthProgram.id,
+        db.session.query(func.max(Enrollment.updated_at)).filter(Enrollment.program_id == program_id).scalar_subquery(),
+        db.session.query(func.max(Enrollment.id)).filter(Enrollment.program_id == program_id).scalar_subquery()
+    ).filter(HealthProgram.id == program_id).first()
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    value = max(values)
+    # Naive timestamps are stored in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+# Answer 304 when the client's If-None-Match / If-Modified-Since still match,
+# otherwise call `build` for the full response. Either way the response
+# carries the ETag and Last-Modified headers.
+def conditional_response(validators, last_modified, build, private=True):
+    etag = hashlib.sha1(repr((tuple(validators), request.query_string)).encode()).hexdigest()
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+
+    response = make_response('', 304) if fresh else build()
+    if response.status_code not in (200, 304):
+        return response
+
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    return response
@@ -0,0 +1,72 @@
+from difflib import SequenceMatcher
+from itertools import combinations
+from sqlalchemy import func, or_
+from models import db, Client, dedupe_key, name_tokens, normalize_phone
+from serializers import columns, serialize_client, CLIENT_FIELDS
+
+
+CANDIDATE_FIELDS = CLIENT_FIELDS + ('phone_normalized',)
+
+
+# How alike two client records are, from 0 to 1, and what matched. Names are
+# compared word-sorted so reordered names still line up.
+def match_score(full_name, phone_normalized, date_of_birth, candidate):
+    name_a = " ".join(sorted(name_tokens(full_name)))
+    name_b = " ".join(sorted(name_tokens(candidate.full_name)))
+    name = SequenceMatcher(None, name_a, name_b).ratio()
+
+    reasons = [f"name {name:.0%} similar"]
+    score = 0.5 * name
+    if phone_normalized and phone_normalized == candidate.phone_normalized:
+        score += 0.25
+        reasons.append("same phone")
+    if date_of_birth == candidate.date_of_birth:
+        score += 0.25
+        reasons.append("same date of birth")
+    elif date_of_birth.year == candidate.date_of_birth.year:
+        score += 0.1
+        reasons.append("same birth year")
+    return round(score, 3), reasons
+
+
+# Registered clients that are likely the same person. Candidates are only
+# the rows sharing the blocking key or the normalized phone, both indexed,
+# so the cost does not depend on the size of the table.
+def find_duplicates(full_name, phone, date_of_birth, threshold=0.65, max_candidates=50):
+    key = dedupe_key(full_name, date_of_birth)
+    phone_normalized = normalize_phone(phone)
+    blocks = [Client.dedupe_key == key] if key else []
+    if phone_normalized:
+        blocks.append(Client.phone_normalized == phone_normalized)
+    if not blocks:
+        return []
+
+    query = db.session.query(*columns(Client, CANDIDATE_FIELDS)).filter(or_(*blocks))
+
+    matches = []
+    for candidate in query.limit(max_candidates):
+        score, reasons = match_score(full_name, phone_normalized, date_of_birth, candidate)
+        if score >= threshold:
+            matches.append(dict(serialize_client(candidate), score=score, reasons=reasons))
+    return sorted(matches, key=lambda match: -match['score'])
+
+
+# Batch job: every pair of likely duplicates among registered clients. Only
+# clients sharing a blocking key are compared; blocks larger than
+# `max_block` are reported instead of compared, as they point at junk data.
+def iter_duplicate_pairs(threshold=0.65, max_block=200):
+    blocks = db.session.query(Client.dedupe_key, func.count(Client.id)).filter(
+        Client.dedupe_key.isnot(None)
+    ).group_by(Client.dedupe_key).having(func.count(Client.id) > 1).order_by(Client.dedupe_key)
+
+    for key, size in blocks.all():
+        if size > max_block:
+            yield {"dedupe_key": key, "skipped": size}
+            continue
+        rows = db.session.query(*columns(Client, CANDIDATE_FIELDS)).filter(
+            Client.dedupe_key == key
+        ).order_by(Client.id).all()
+        for first, second in combinations(rows, 2):
+            score, reasons = match_score(first.full_name, first.phone_normalized, first.date_of_birth, second)
+            if score >= threshold:
+                yield {"client_ids": [first.id, second.id], "score": score, "reasons": reasons}
@@ -0,0 +1,71 @@
+from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, utcnow, Enrollment, ENROLLMENT_TRANSITIONS
+
+
+# Ids sent in a JSON body, as integers. Numeric strings are accepted, as the
+# primary key lookups always did; booleans, which are ints to Python, are not.
+def parse_ids(values):
+    if not isinstance(values, list):
+        raise ValueError("Client and Program IDs must be lists of integers")
+    ids = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError("Client and Program IDs must be lists of integers")
+        try:
+            ids.append(int(value))
+        except ValueError:
+            raise ValueError("Client and Program IDs must be lists of integers")
+    return ids
+
+
+# Enroll every client in every program, skipping pairs that already exist.
+# Ids must already be validated. On Postgres and SQLite each batch is a single
+# INSERT ... ON CONFLICT DO NOTHING, which the unique (client_id, program_id)
+# constraint keeps safe under concurrent requests.
+def enroll_pairs(client_ids, program_ids):
+    pairs = [(client_id, program_id) for client_id in client_ids for program_id in program_ids]
+    dialect = db.session.get_bind().dialect.name
+    created = set()
+
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        batch_size = current_app.config['ENROLL_BATCH_SIZE']
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            statement = dialect_insert(Enrollment).values(
+                [{'client_id': client_id, 'program_id': program_id} for client_id, program_id in batch]
+            ).on_conflict_do_nothing(
+                index_elements=['client_id', 'program_id']
+            ).returning(Enrollment.client_id, Enrollment.program_id)
+            created.update(tuple(row) for row in db.session.execute(statement))
+    else:
+        existing = set(db.session.query(Enrollment.client_id, Enrollment.program_id).filter(
+            Enrollment.client_id.in_(client_ids),
+            Enrollment.program_id.in_(program_ids)
+        ).all())
+        created = {pair for pair in pairs if pair not in existing}
+        if created:
+            db.session.execute(insert(Enrollment), [
+                {'client_id': client_id, 'program_id': program_id} for client_id, program_id in created
+            ])
+
+    return [{
+        "client_id": client_id,
+        "program_id": program_id,
+        "status": "enrolled" if (client_id, program_id) in created else "already_enrolled"
+    } for client_id, program_id in pairs]
+
+
+# Move every enrollment matching `criteria` to `status` with one UPDATE.
+# Only rows whose current status may change to `status` are touched, and
+# they all get the same updated_at. Returns the number of rows changed.
+def transition_enrollments(status, *criteria):
+    sources = [source for source, targets in ENROLLMENT_TRANSITIONS.items() if status in targets]
+    if not sources:
+        return 0
+    statement = update(Enrollment).where(
+        Enrollment.status.in_(sources), *criteria
+    ).values(status=status, updated_at=utcnow()).execution_options(synchronize_session=False)
+    return db.session.execute(statement).rowcount
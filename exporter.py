@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from models import db, Client, Enrollment, HealthProgram
+from serializers import serialize_client, serialize_enrollment, CLIENT_FIELDS
+
+
+# Flush streamed CSV output in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+CLIENT_COLUMNS = CLIENT_FIELDS
+ENROLLMENT_COLUMNS = ('enrollment_id', 'program_id', 'program_name', 'enrolled_at', 'status')
+
+
+# Clients joined to their enrollments and program names, read through a
+# server-side cursor `batch_size` rows at a time
+def iter_export_rows(batch_size=1000):
+    statement = select(
+        *[getattr(Client, column) for column in CLIENT_COLUMNS],
+        Enrollment.id.label('enrollment_id'),
+        Enrollment.program_id,
+        HealthProgram.name.label('program_name'),
+        Enrollment.enrolled_at,
+        Enrollment.status
+    ).outerjoin(
+        Enrollment, Enrollment.client_id == Client.id
+    ).outerjoin(
+        HealthProgram, HealthProgram.id == Enrollment.program_id
+    ).order_by(Client.id, Enrollment.id).execution_options(yield_per=batch_size)
+
+    yield from db.session.execute(statement)
+
+
+# Values are formatted by the same converters as the JSON endpoints, so a
+# client reads the same in the export as from GET /clients/<id>
+def _enrolled_at(value):
+    return serialize_enrollment.converters['enrolled_at'](value) if value is not None else None
+
+
+# One JSON line per client with its enrollments nested. Rows arrive ordered
+# by client, so only the client being assembled is held in memory.
+# `progress`, if given, is called with the number of clients written so far.
+def export_ndjson(batch_size=1000, progress=None):
+    current = None
+    written = 0
+    for row in iter_export_rows(batch_size):
+        if current is None or current['id'] != row.id:
+            if current is not None:
+                yield json.dumps(current) + "\n"
+                written += 1
+                if progress is not None and written % batch_size == 0:
+                    progress(written)
+            current = serialize_client(row)
+            current['enrollments'] = []
+        if row.enrollment_id is not None:
+            current['enrollments'].append({
+                "id": row.enrollment_id,
+                "program_id": row.program_id,
+                "program_name": row.program_name,
+                "enrolled_at": _enrolled_at(row.enrolled_at),
+                "status": row.status
+            })
+    if current is not None:
+        yield json.dumps(current) + "\n"
+        written += 1
+    if progress is not None:
+        progress(written)
+
+
+# One CSV line per client and enrollment; clients without enrollments get one
+# line with the enrollment columns left empty. `progress` is as for export_ndjson.
+def export_csv(batch_size=1000, progress=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(CLIENT_COLUMNS + ENROLLMENT_COLUMNS)
+    written, last_id = 0, None
+    for row in iter_export_rows(batch_size):
+        client = serialize_client(row)
+        writer.writerow([client[column] for column in CLIENT_COLUMNS] + [
+            row.enrollment_id, row.program_id, row.program_name, _enrolled_at(row.enrolled_at), row.status
+        ])
+        if row.id != last_id:
+            written, last_id = written + 1, row.id
+        if buffer.tell() >= CHUNK_SIZE:
+            yield take()
+            if progress is not None:
+                progress(written)
+    yield take()
+    if progress is not None:
+        progress(written)
@@ -0,0 +1,48 @@
+"""gunicorn settings, picked up automatically from the working directory.
+
+The app is built once in the master (preload) and shared with the workers
+copy-on-write. Every setting can be overridden from the environment.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Threads keep a worker busy on one slow request from blocking the others
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then, staggered so they do not restart together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Worker heartbeats go to tmpfs so a slow disk cannot stall them
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+# Everything loaded so far is moved out of the collector's reach, so the
+# workers' garbage collections do not write to, and copy, the shared pages
+def when_ready(server):
+    if server.cfg.preload_app:
+        gc.freeze()
+
+
+# Connections must never be shared across a fork. Drop any the master opened
+# without closing them, so the parent's sockets are left alone.
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from models import db
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
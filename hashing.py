@@ -0,0 +1,67 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.exceptions import ServiceUnavailable
+
+
+# Raised when the hashing pool and its queue are full; answered with a 503
+class PasswordHasherBusy(ServiceUnavailable):
+    def __init__(self):
+        super().__init__(retry_after=1)
+        self.data = {"error": "Server is busy, please try again shortly"}
+
+
+# Runs bcrypt on a small bounded thread pool. bcrypt releases the GIL, so
+# hashing no longer holds up other threads in the worker, and at most
+# `workers + queue` hashes can be pending before callers get a fast 503.
+class PasswordHasher:
+    def __init__(self, bcrypt, app=None):
+        self.bcrypt = bcrypt
+        self.rounds = 12
+        self.timeout = 10
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+        self.timeout = app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+        workers = app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 2)
+        queue = app.config.setdefault('PASSWORD_HASH_QUEUE', 32)
+
+        # Threads start on first use, so this is safe to set up before forking
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def _run(self, fn, *args):
+        # Without init_app (e.g. a plain script) hash inline
+        if self._executor is None:
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy()
+
+    def hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password, self.rounds).decode("utf-8")
+
+    def verify(self, password_hash, password):
+        return self._run(self.bcrypt.check_password_hash, password_hash, password)
+
+    # True when the hash was made with a different work factor than configured
+    def needs_rehash(self, password_hash):
+        try:
+            return int(password_hash.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
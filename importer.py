@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, utcnow, Client
+
+
+CLIENT_FIELDS = ('full_name', 'phone', 'address', 'date_of_birth', 'gender')
+CLIENT_COLUMNS = CLIENT_FIELDS + ('phone_normalized', 'dedupe_key', 'created_at', 'updated_at')
+
+
+# Yield (line number, record) pairs from a CSV or NDJSON text stream
+def iter_records(stream, fmt):
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, record
+    else:
+        raise ValueError("Format must be csv or ndjson")
+
+
+# Check a record against the same rules as POST /clients and return the row to insert
+def build_client_row(record):
+    if not isinstance(record, dict):
+        raise ValueError("Row is not a valid record")
+
+    values = {field: (record.get(field) or None) for field in CLIENT_FIELDS}
+    if not all([values['full_name'], values['gender'], values['phone'], values['date_of_birth']]):
+        raise ValueError("Missing required fields")
+
+    try:
+        values['date_of_birth'] = datetime.strptime(values['date_of_birth'], "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date format. Expected format: YYYY-MM-DD")
+
+    # Building a transient Client runs its @validates rules
+    try:
+        client = Client(**values)
+    except (TypeError, AttributeError):
+        raise ValueError("Fields must be strings")
+    return {column: getattr(client, column) for column in CLIENT_FIELDS + ('phone_normalized', 'dedupe_key')}
+
+
+# Insert a batch with COPY on Postgres (psycopg2) and executemany elsewhere
+def insert_client_rows(rows):
+    now = utcnow()
+    for row in rows:
+        row['created_at'] = now
+        row['updated_at'] = now
+
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in CLIENT_COLUMNS])
+        buffer.seek(0)
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY clients ({', '.join(CLIENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+    else:
+        db.session.execute(insert(Client), rows)
+
+
+# Import clients from a stream, committing every `batch_size` valid rows.
+# Yields a report entry for every rejected row followed by a summary, so
+# neither the upload nor the report is ever held in memory as a whole.
+# `progress`, if given, is called with the rows processed after every commit.
+def import_clients(stream, fmt, batch_size=5000, progress=None):
+    imported = rejected = 0
+    batch, batch_lines = [], []
+
+    def flush():
+        try:
+            insert_client_rows(batch)
+            db.session.commit()
+            return None
+        except Exception as e:
+            db.session.rollback()
+            return str(e)
+
+    for line_no, record in iter_records(stream, fmt):
+        try:
+            batch.append(build_client_row(record))
+            batch_lines.append(line_no)
+        except ValueError as e:
+            rejected += 1
+            yield {"line": line_no, "error": str(e)}
+
+        if len(batch) >= batch_size:
+            error = flush()
+            if error:
+                rejected += len(batch)
+                yield {"lines": [batch_lines[0], batch_lines[-1]], "error": error}
+            else:
+                imported += len(batch)
+            batch, batch_lines = [], []
+            if progress is not None:
+                progress(imported + rejected)
+
+    if batch:
+        error = flush()
+        if error:
+            rejected += len(batch)
+            yield {"lines": [batch_lines[0], batch_lines[-1]], "error": error}
+        else:
+            imported += len(batch)
+
+    yield {"summary": {"imported": imported, "rejected": rejected}}
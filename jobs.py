@@ -0,0 +1,351 @@
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import time
+from collections import namedtuple
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import func, update
+from sqlalchemy.exc import OperationalError
+from models import db, utcnow, Client, HealthProgram, Job
+from importer import import_clients
+from exporter import export_csv, export_ndjson
+from dedupe import iter_duplicate_pairs
+from enrollments import parse_ids, enroll_pairs
+
+
+class JobError(ValueError):
+    pass
+
+
+# What a job kind runs, how its parameters are checked and whether it reads an upload
+JobType = namedtuple('JobType', ['run', 'validate', 'upload'])
+JOB_TYPES = {}
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def job_type(kind, validate, upload=False):
+    def register(run):
+        JOB_TYPES[kind] = JobType(run, validate, upload)
+        return run
+    return register
+
+
+# Uploads and results live in JOB_RESULT_DIR, which the web and worker
+# processes must share
+def job_file(job_id, name):
+    return os.path.join(current_app.config['JOB_RESULT_DIR'], f"{job_id}-{name}")
+
+
+# Handed to a running job to report progress and write its result
+class JobContext:
+    def __init__(self, job, interval=1.0):
+        self.job_id = job.id
+        self.params = dict(job.params or {})
+        self.interval = interval
+        self.done = 0
+        self.result_name = self.result_mimetype = None
+        self._reported = 0.0
+
+    def input_path(self):
+        return job_file(self.job_id, self.params['input'])
+
+    def open_result(self, name, mimetype):
+        self.result_name, self.result_mimetype = name, mimetype
+        return open(job_file(self.job_id, name), 'w', encoding='utf-8', newline='')
+
+    # Progress is written at most once per `interval` seconds, in a transaction
+    # of its own so it shows while the job's work is still uncommitted. It is
+    # best effort: a write that fails, e.g. on a locked SQLite file, is skipped.
+    def progress(self, done, total=None, force=False):
+        self.done = done
+        if not force and time.monotonic() - self._reported < self.interval:
+            return
+        self._reported = time.monotonic()
+        values = {'progress': done} if total is None else {'progress': done, 'total': total}
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(update(Job).where(Job.id == self.job_id).values(**values))
+        except OperationalError:
+            pass
+
+    def cleanup(self):
+        if 'input' in self.params and os.path.exists(self.input_path()):
+            os.remove(self.input_path())
+
+
+def validate_format(params):
+    fmt = params.get('format', 'ndjson')
+    if fmt not in EXPORT_MIMETYPES:
+        raise JobError("Format must be csv or ndjson")
+    return {'format': fmt}
+
+
+def validate_enrollment(params):
+    client_ids, program_ids = params.get('client_ids'), params.get('program_ids')
+    if not client_ids or not program_ids:
+        raise JobError("client_ids and program_ids must be non-empty lists of integers")
+    try:
+        client_ids, program_ids = parse_ids(client_ids), parse_ids(program_ids)
+    except ValueError:
+        raise JobError("client_ids and program_ids must be non-empty lists of integers")
+    return {'client_ids': list(dict.fromkeys(client_ids)), 'program_ids': list(dict.fromkeys(program_ids))}
+
+
+def validate_duplicates(params):
+    try:
+        threshold = float(params.get('threshold', current_app.config['DEDUPE_THRESHOLD']))
+        max_block = int(params.get('max_block', 200))
+    except (TypeError, ValueError):
+        raise JobError("threshold must be a number and max_block an integer")
+    if not 0 <= threshold <= 1 or max_block < 2:
+        raise JobError("threshold must be between 0 and 1 and max_block at least 2")
+    return {'threshold': threshold, 'max_block': max_block}
+
+
+# Progress counts clients written
+@job_type('export_clients', validate_format)
+def export_clients_job(params, job):
+    fmt = params['format']
+    job.progress(0, db.session.query(func.count(Client.id)).scalar(), force=True)
+    export = export_csv if fmt == 'csv' else export_ndjson
+    with job.open_result(f"clients.{fmt}", EXPORT_MIMETYPES[fmt]) as output:
+        for chunk in export(current_app.config['EXPORT_BATCH_SIZE'], progress=job.progress):
+            output.write(chunk)
+    return {"exported": job.done}
+
+
+# Progress counts bytes of the upload read; the result is the import report
+@job_type('import_clients', validate_format, upload=True)
+def import_clients_job(params, job):
+    size = os.path.getsize(job.input_path())
+    summary = None
+    with open(job.input_path(), 'rb') as raw, job.open_result('import-report.ndjson', EXPORT_MIMETYPES['ndjson']) as output:
+        job.progress(0, size, force=True)
+        stream = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        report = import_clients(
+            stream, params['format'], current_app.config['IMPORT_BATCH_SIZE'],
+            progress=lambda rows: job.progress(raw.tell(), size)
+        )
+        for entry in report:
+            output.write(json.dumps(entry) + "\n")
+            summary = entry.get('summary', summary)
+    job.progress(size, size, force=True)
+    return summary
+
+
+# Enrollments without a pair limit, committed a batch of clients at a time.
+# Progress counts clients; the result has one line per client and program.
+@job_type('enroll_clients', validate_enrollment)
+def enroll_clients_job(params, job):
+    client_ids, program_ids = params['client_ids'], params['program_ids']
+    found_programs = {row.id for row in db.session.query(HealthProgram.id).filter(HealthProgram.id.in_(program_ids))}
+    missing_programs = [i for i in program_ids if i not in found_programs]
+    if missing_programs:
+        raise JobError(f"Program with ID {missing_programs[0]} not found")
+
+    summary = {"enrolled": 0, "already_enrolled": 0, "missing_client_ids": []}
+    step = max(1, current_app.config['ENROLL_BATCH_SIZE'] // len(program_ids))
+    job.progress(0, len(client_ids), force=True)
+    with job.open_result('enrollments.ndjson', EXPORT_MIMETYPES['ndjson']) as output:
+        for start in range(0, len(client_ids), step):
+            batch = client_ids[start:start + step]
+            found = {row.id for row in db.session.query(Client.id).filter(Client.id.in_(batch))}
+            summary["missing_client_ids"].extend(i for i in batch if i not in found)
+            results = enroll_pairs([i for i in batch if i in found], program_ids) if found else []
+            db.session.commit()
+            for result in results:
+                summary[result['status']] += 1
+                output.write(json.dumps(result) + "\n")
+            job.progress(start + len(batch), len(client_ids))
+    return summary
+
+
+# Progress counts pairs found; the result is what `flask find-duplicates` prints
+@job_type('find_duplicates', validate_duplicates)
+def find_duplicates_job(params, job):
+    pairs = skipped = 0
+    with job.open_result('duplicates.ndjson', EXPORT_MIMETYPES['ndjson']) as output:
+        for entry in iter_duplicate_pairs(params['threshold'], params['max_block']):
+            output.write(json.dumps(entry) + "\n")
+            if 'skipped' in entry:
+                skipped += 1
+            else:
+                pairs += 1
+                job.progress(pairs)
+    return {"pairs": pairs, "skipped_blocks": skipped}
+
+
+# Queue a job of `kind` for `user_id` once its parameters check out. Kinds
+# that read an upload copy `upload`, a binary file object, next to the results.
+def submit_job(kind, params, user_id, upload=None):
+    job_type = JOB_TYPES.get(kind)
+    if job_type is None:
+        raise JobError(f"Job kind must be one of {sorted(JOB_TYPES)}")
+    params = job_type.validate(params or {})
+    if job_type.upload and upload is None:
+        raise JobError("This job needs an uploaded file")
+
+    job = Job(kind=kind, params=params, created_by=user_id)
+    db.session.add(job)
+    db.session.flush()
+    if job_type.upload:
+        name = f"input.{params['format']}"
+        os.makedirs(current_app.config['JOB_RESULT_DIR'], exist_ok=True)
+        with open(job_file(job.id, name), 'wb') as handle:
+            shutil.copyfileobj(upload, handle)
+        job.params = dict(params, input=name)
+    db.session.commit()
+    return job
+
+
+# Run one claimed job to the end and record how it went
+def run_job(job_id):
+    job = db.session.get(Job, job_id)
+    context = JobContext(job)
+    try:
+        os.makedirs(current_app.config['JOB_RESULT_DIR'], exist_ok=True)
+        summary = JOB_TYPES[job.kind].run(context.params, context)
+    except Exception as e:
+        db.session.rollback()
+        finish_job(job_id, 'failed', error=str(e) or type(e).__name__)
+        return
+    finally:
+        context.cleanup()
+    finish_job(
+        job_id, 'succeeded', summary=summary, progress=context.done,
+        result_name=context.result_name, result_mimetype=context.result_mimetype
+    )
+
+
+def finish_job(job_id, status, **values):
+    db.session.execute(update(Job).where(Job.id == job_id).values(status=status, finished_at=utcnow(), **values))
+    db.session.commit()
+
+
+# Claim the oldest queued job for `worker`. The status check in the UPDATE
+# keeps two pools polling the same table from claiming the same job.
+def claim_job(worker):
+    while True:
+        job_id = db.session.query(Job.id).filter(Job.status == 'queued').order_by(Job.id).limit(1).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+            status='running', worker=worker, started_at=utcnow(), heartbeat_at=utcnow()
+        )).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+
+
+# Mark the pool's running jobs alive, and fail running jobs nobody has
+# vouched for in `stale_seconds`, as the pool that ran them is gone
+def heartbeat(job_ids, stale_seconds):
+    try:
+        if job_ids:
+            db.session.execute(update(Job).where(Job.id.in_(job_ids)).values(heartbeat_at=utcnow()))
+        db.session.execute(update(Job).where(
+            Job.status == 'running', Job.heartbeat_at < utcnow() - timedelta(seconds=stale_seconds)
+        ).values(status='failed', finished_at=utcnow(), error="Worker stopped responding"))
+        db.session.commit()
+    except OperationalError:
+        db.session.rollback()
+
+
+# Delete files in JOB_RESULT_DIR older than `ttl_seconds`, except those of
+# queued and running jobs. Results removed here answer 410 on download.
+def remove_expired_files(ttl_seconds):
+    directory = current_app.config['JOB_RESULT_DIR']
+    if not os.path.isdir(directory):
+        return 0
+    active = {str(job_id) for job_id, in db.session.query(Job.id).filter(Job.status.in_(('queued', 'running')))}
+    db.session.rollback()
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for entry in os.scandir(directory):
+        job_id = entry.name.partition('-')[0]
+        if entry.is_file() and job_id not in active and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+_worker_app = None
+
+
+# Runs once in every pool process. Each builds an app of its own, and leaves
+# Ctrl-C to the dispatcher so the job it is running can finish.
+def init_worker():
+    global _worker_app
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from app import create_app
+    _worker_app = create_app()
+
+
+def execute(job_id):
+    with _worker_app.app_context():
+        run_job(job_id)
+
+
+# Claim queued jobs and run them on `workers` processes, polling every
+# `poll_seconds`. SIGINT and SIGTERM stop claiming and wait for running jobs;
+# with `burst` the loop also ends once the queue is empty. Files older than
+# `result_ttl` seconds are removed every `sweep_seconds`; 0 keeps them.
+def run_workers(workers, poll_seconds=1.0, stale_seconds=300, burst=False, result_ttl=0, sweep_seconds=600):
+    # Only the job runner needs process pools; web workers never import them
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from concurrent.futures.process import BrokenProcessPool
+
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stopping.append(signum))
+
+    # Pool processes are spawned, not forked, so none inherits our connections
+    context = multiprocessing.get_context('spawn')
+    pool, running, beat, swept = None, {}, 0.0, None
+    try:
+        while True:
+            for future in [future for future in running if future.done()]:
+                job_id = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    finish_job(job_id, 'failed', error=f"Worker process failed: {error!r}")
+                    if isinstance(error, BrokenProcessPool) and pool is not None:
+                        pool.shutdown(wait=False)
+                        pool = None
+
+            if time.monotonic() - beat >= min(poll_seconds * 10, stale_seconds / 3):
+                heartbeat(list(running.values()), stale_seconds)
+                beat = time.monotonic()
+
+            if result_ttl and (swept is None or time.monotonic() - swept >= sweep_seconds):
+                remove_expired_files(result_ttl)
+                swept = time.monotonic()
+
+            while not stopping and len(running) < workers:
+                job_id = claim_job(name)
+                if job_id is None:
+                    break
+                if pool is None:
+                    pool = ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker)
+                running[pool.submit(execute, job_id)] = job_id
+
+            if not running and (stopping or burst):
+                break
+            if running:
+                wait(running, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(poll_seconds)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
@@ -0,0 +1,161 @@
+import bisect
+import threading
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DEFAULT_QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+# Cumulative Prometheus-style histogram. Not locked itself; Metrics holds
+# one lock around every update and the rendering.
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield _number(bound), total
+        yield '+Inf', self.count
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+# Per-endpoint request latency, SQL statement counts and SQL time, kept in
+# process memory and rendered in the Prometheus text format. Each gunicorn
+# worker keeps its own numbers, so scrape every worker or run one per pod.
+#
+# Statements are counted with the engine's cursor events, which fire for
+# every engine in the process; statements run outside a request (CLI
+# commands, background threads) are not attributed to any endpoint.
+class Metrics:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.queries = {}
+        self.sql_seconds = {}
+        self.over_budget = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_QUERY_BUDGET', 20)
+        app.config.setdefault('METRICS_LATENCY_BUCKETS', DEFAULT_LATENCY_BUCKETS)
+        app.config.setdefault('METRICS_QUERY_BUCKETS', DEFAULT_QUERY_BUCKETS)
+
+        self.app = app
+        self.query_budget = app.config['METRICS_QUERY_BUDGET']
+        self.latency_buckets = app.config['METRICS_LATENCY_BUCKETS']
+        self.query_buckets = app.config['METRICS_QUERY_BUCKETS']
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+        if not event.contains(Engine, 'before_cursor_execute', self.before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_sql_seconds = 0.0
+
+    def after_request(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    # Runs after streamed bodies finish, so exports are timed in full
+    def teardown_request(self, exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        queries = g.pop('metrics_queries', 0)
+        sql_seconds = g.pop('metrics_sql_seconds', 0.0)
+        status = 500 if exc is not None else g.pop('metrics_status', 500)
+        key = (request.method, request.endpoint or 'unmatched')
+
+        with self._lock:
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(self.latency_buckets)
+                self.queries[key] = Histogram(self.query_buckets)
+                self.sql_seconds[key] = 0.0
+            self.latency[key].observe(elapsed)
+            self.queries[key].observe(queries)
+            self.sql_seconds[key] += sql_seconds
+            if self.query_budget and queries > self.query_budget:
+                self.over_budget[key] = self.over_budget.get(key, 0) + 1
+
+        if self.query_budget and queries > self.query_budget:
+            self.app.logger.warning(
+                "%s %s issued %d SQL statements (budget %d) in %.1f ms",
+                request.method, request.path, queries, self.query_budget, elapsed * 1000
+            )
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics_started' in g:
+            conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_query_started')
+        if started and has_request_context() and 'metrics_started' in g:
+            g.metrics_queries += 1
+            g.metrics_sql_seconds += time.perf_counter() - started.pop()
+
+    def render(self):
+        lines = []
+
+        def histogram(name, help_text, histograms):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, endpoint), hist in sorted(histograms.items()):
+                for bound, count in hist.samples():
+                    lines.append(f"{name}_bucket{_labels(method=method, endpoint=endpoint, le=bound)} {count}")
+                lines.append(f"{name}_sum{_labels(method=method, endpoint=endpoint)} {_number(hist.sum)}")
+                lines.append(f"{name}_count{_labels(method=method, endpoint=endpoint)} {hist.count}")
+
+        def counter(name, help_text, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(values.items()):
+                labels = dict(zip(('method', 'endpoint', 'status'), key))
+                lines.append(f"{name}{_labels(**labels)} {_number(value)}")
+
+        with self._lock:
+            counter('http_requests_total', "Requests handled, by endpoint and status.", self.requests)
+            histogram('http_request_duration_seconds', "Request latency, including streamed bodies.", self.latency)
+            histogram('http_request_sql_statements', "SQL statements issued per request.", self.queries)
+            counter('http_request_sql_seconds_total', "Time spent executing SQL, by endpoint.", self.sql_seconds)
+            counter('http_request_sql_budget_exceeded_total',
+                    f"Requests that issued more than {self.query_budget} SQL statements.", self.over_budget)
+
+        lines.append("# HELP sql_query_budget Configured SQL statements allowed per request.")
+        lines.append("# TYPE sql_query_budget gauge")
+        lines.append(f"sql_query_budget {self.query_budget}")
+        return '\n'.join(lines) + '\n'
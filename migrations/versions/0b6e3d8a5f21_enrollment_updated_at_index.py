@@ -0,0 +1,27 @@
+"""enrollment updated_at index
+
+Revision ID: 0b6e3d8a5f21
+Revises: f27b0d9c4e18
+Create Date: 2026-10-17 13:55:12.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e3d8a5f21'
+down_revision = 'f27b0d9c4e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lets MAX(updated_at) for conditional GETs read one index entry
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.create_index('ix_enrollments_updated_at_id', ['updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.drop_index('ix_enrollments_updated_at_id')
@@ -0,0 +1,27 @@
+"""user last write at
+
+Revision ID: 3e8a1c6b9d52
+Revises: 9c2f5d7e1a46
+Create Date: 2026-10-17 20:48:19.335207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8a1c6b9d52'
+down_revision = '9c2f5d7e1a46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keeps a user's reads on the primary for a while after they write
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_write_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('last_write_at')
@@ -0,0 +1,43 @@
+"""utc timestamp server defaults
+
+Revision ID: 6f1d4b2a8e37
+Revises: 3e8a1c6b9d52
+Create Date: 2026-10-17 21:05:44.918260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1d4b2a8e37'
+down_revision = '3e8a1c6b9d52'
+branch_labels = None
+depends_on = None
+
+
+TIMESTAMPS = {
+    'clients': ('created_at', 'updated_at'),
+    'enrollments': ('enrolled_at', 'updated_at'),
+    'jobs': ('created_at',),
+}
+
+
+def upgrade():
+    # now() is in the session's time zone, while the ORM stamps UTC. SQLite's
+    # CURRENT_TIMESTAMP is already UTC.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, names in TIMESTAMPS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(name, existing_type=sa.DateTime(), server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, names in TIMESTAMPS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(name, existing_type=sa.DateTime(), server_default=sa.func.now())
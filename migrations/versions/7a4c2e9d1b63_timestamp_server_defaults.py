@@ -0,0 +1,48 @@
+"""timestamp server defaults
+
+Revision ID: 7a4c2e9d1b63
+Revises: 0b6e3d8a5f21
+Create Date: 2026-10-17 17:41:08.215530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4c2e9d1b63'
+down_revision = '0b6e3d8a5f21'
+branch_labels = None
+depends_on = None
+
+
+TIMESTAMPS = {
+    'clients': ('created_at', 'updated_at'),
+    'enrollments': ('enrolled_at', 'updated_at'),
+}
+
+
+def upgrade():
+    # Rows without updated_at would never show up in the change feed
+    op.execute("UPDATE clients SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    op.execute("UPDATE clients SET created_at = updated_at WHERE created_at IS NULL")
+    op.execute("UPDATE enrollments SET updated_at = COALESCE(enrolled_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    op.execute("UPDATE enrollments SET enrolled_at = updated_at WHERE enrolled_at IS NULL")
+
+    # On SQLite a new default means rebuilding the table, which would drop the
+    # clients FTS triggers; the ORM's own defaults already stamp every insert
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    for table, names in TIMESTAMPS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(name, existing_type=sa.DateTime(), server_default=sa.func.now())
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    for table, names in TIMESTAMPS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in names:
+                batch_op.alter_column(name, existing_type=sa.DateTime(), server_default=None)
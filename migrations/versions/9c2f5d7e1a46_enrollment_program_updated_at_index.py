@@ -0,0 +1,27 @@
+"""enrollment program updated_at index
+
+Revision ID: 9c2f5d7e1a46
+Revises: b4e7c1f93a28
+Create Date: 2026-10-17 20:12:37.480915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2f5d7e1a46'
+down_revision = 'b4e7c1f93a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lets a program's MAX(updated_at) for conditional GETs read one index entry
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.create_index('ix_enrollments_program_id_updated_at', ['program_id', 'updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.drop_index('ix_enrollments_program_id_updated_at')
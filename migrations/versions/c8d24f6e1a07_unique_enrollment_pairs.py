@@ -0,0 +1,31 @@
+"""unique enrollment pairs
+
+Revision ID: c8d24f6e1a07
+Revises: a3c1e7f20b94
+Create Date: 2026-10-17 10:03:18.552931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d24f6e1a07'
+down_revision = 'a3c1e7f20b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the earliest enrollment of any duplicated pair so the constraint can be created
+    op.execute(
+        "DELETE FROM enrollments WHERE id NOT IN "
+        "(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM enrollments GROUP BY client_id, program_id) AS keep)"
+    )
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_enrollments_client_program', ['client_id', 'program_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_enrollments_client_program', type_='unique')
@@ -0,0 +1,49 @@
+"""client dedupe key
+
+Revision ID: d5b8f3a06c19
+Revises: 7a4c2e9d1b63
+Create Date: 2026-10-17 18:02:37.440218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models import dedupe_key
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b8f3a06c19'
+down_revision = '7a4c2e9d1b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('dedupe_key', sa.String(length=12), nullable=True))
+        batch_op.create_index(batch_op.f('ix_clients_dedupe_key'), ['dedupe_key'], unique=False)
+
+    # Backfill blocking keys for existing clients, a batch at a time
+    bind = op.get_bind()
+    clients = sa.table('clients', sa.column('id'), sa.column('full_name'), sa.column('date_of_birth', sa.Date),
+                       sa.column('dedupe_key'))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(clients.c.id, clients.c.full_name, clients.c.date_of_birth)
+            .where(clients.c.id > last_id).order_by(clients.c.id).limit(10000)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            clients.update().where(clients.c.id == sa.bindparam('client_id')).values(dedupe_key=sa.bindparam('key')),
+            [{'client_id': row.id, 'key': dedupe_key(row.full_name, row.date_of_birth)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    # A plain DROP COLUMN, as a batch rebuild of clients would drop its
+    # full-text triggers on SQLite
+    op.drop_index(op.f('ix_clients_dedupe_key'), table_name='clients')
+    op.drop_column('clients', 'dedupe_key')
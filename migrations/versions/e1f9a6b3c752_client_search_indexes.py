@@ -0,0 +1,72 @@
+"""client search indexes
+
+Revision ID: e1f9a6b3c752
+Revises: c8d24f6e1a07
+Create Date: 2026-10-17 11:27:05.340817
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f9a6b3c752'
+down_revision = 'c8d24f6e1a07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phone_normalized', sa.String(length=15), nullable=True))
+        batch_op.create_index(batch_op.f('ix_clients_phone_normalized'), ['phone_normalized'], unique=False)
+
+    # Backfill normalized phones for existing clients
+    bind = op.get_bind()
+    clients = sa.table('clients', sa.column('id'), sa.column('phone'), sa.column('phone_normalized'))
+    rows = bind.execute(sa.select(clients.c.id, clients.c.phone).where(clients.c.phone.isnot(None))).all()
+    if rows:
+        bind.execute(
+            clients.update().where(clients.c.id == sa.bindparam('client_id')).values(phone_normalized=sa.bindparam('normalized')),
+            [{'client_id': row.id, 'normalized': re.sub(r"\D", "", row.phone) or None} for row in rows]
+        )
+
+    # Name search: trigram index on Postgres, external-content FTS5 table on SQLite
+    if bind.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_clients_full_name_trgm ON clients USING gin (full_name gin_trgm_ops)")
+    elif bind.dialect.name == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE clients_fts USING fts5("
+            "full_name, content='clients', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER clients_fts_ai AFTER INSERT ON clients BEGIN "
+            "INSERT INTO clients_fts(rowid, full_name) VALUES (new.id, new.full_name); END"
+        )
+        op.execute(
+            "CREATE TRIGGER clients_fts_ad AFTER DELETE ON clients BEGIN "
+            "INSERT INTO clients_fts(clients_fts, rowid, full_name) VALUES ('delete', old.id, old.full_name); END"
+        )
+        op.execute(
+            "CREATE TRIGGER clients_fts_au AFTER UPDATE OF full_name ON clients BEGIN "
+            "INSERT INTO clients_fts(clients_fts, rowid, full_name) VALUES ('delete', old.id, old.full_name); "
+            "INSERT INTO clients_fts(rowid, full_name) VALUES (new.id, new.full_name); END"
+        )
+        op.execute("INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_clients_full_name_trgm")
+    elif bind.dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS clients_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS clients_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS clients_fts_ai")
+        op.execute("DROP TABLE IF EXISTS clients_fts")
+
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_clients_phone_normalized'))
+        batch_op.drop_column('phone_normalized')
@@ -0,0 +1,46 @@
+"""hot path indexes
+
+Revision ID: f27b0d9c4e18
+Revises: e1f9a6b3c752
+Create Date: 2026-10-17 12:40:51.902374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f27b0d9c4e18'
+down_revision = 'e1f9a6b3c752'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # AdminCheck filters users by role
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_role'), ['role'], unique=False)
+
+    # Date of birth filters and the change-ordered (updated_at, id) scan
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_clients_date_of_birth'), ['date_of_birth'], unique=False)
+        batch_op.create_index('ix_clients_updated_at_id', ['updated_at', 'id'], unique=False)
+
+    # Per-program enrollment pages and status filters. Lookups by client_id
+    # use the unique (client_id, program_id) constraint's index.
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.create_index('ix_enrollments_program_id_id', ['program_id', 'id'], unique=False)
+        batch_op.create_index('ix_enrollments_status_program_id', ['status', 'program_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('enrollments', schema=None) as batch_op:
+        batch_op.drop_index('ix_enrollments_status_program_id')
+        batch_op.drop_index('ix_enrollments_program_id_id')
+
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.drop_index('ix_clients_updated_at_id')
+        batch_op.drop_index(batch_op.f('ix_clients_date_of_birth'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_role'))
@@ -1,34 +1,150 @@
 import re
+import unicodedata
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy_serializer import SerializerMixin
 from flask_bcrypt import Bcrypt
+from hashing import PasswordHasher
+from routing import RoutingSession
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import validates
+from sqlalchemy.sql.functions import FunctionElement
 import enum
 from datetime import datetime, date, timezone
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
+password_hasher = PasswordHasher(bcrypt)
+
+
+# Timestamp defaults must be callables, or every row gets the import time.
+# The columns are naive and hold UTC; an aware value would be shifted to the
+# session's time zone by Postgres when stored.
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Digits only, so "+254 712-345-678" and "254712345678" look the same
+def normalize_phone(phone):
+    if not phone:
+        return None
+    return re.sub(r"\D", "", phone) or None
+
+
+SOUNDEX_CODES = {
+    letter: digit
+    for digit, letters in (('1', 'bfpv'), ('2', 'cgjkqsxz'), ('3', 'dt'), ('4', 'l'), ('5', 'mn'), ('6', 'r'))
+    for letter in letters
+}
+
+
+# Lowercase ASCII words of a name, with accents stripped
+def name_tokens(name):
+    if not name:
+        return []
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    return re.findall(r"[a-z]+", ascii_name.lower())
+
+
+# American Soundex: "Robert" and "Rupert" are both R163
+def soundex(word):
+    code, last = word[0].upper(), SOUNDEX_CODES.get(word[0])
+    for letter in word[1:]:
+        digit = SOUNDEX_CODES.get(letter)
+        if digit and digit != last:
+            code += digit
+        if letter not in 'hw':
+            last = digit
+    return (code + '000')[:4]
+
+
+# Blocking key for duplicate detection: the Soundex codes of the first and
+# last names, in sorted order so "Doe Jane" matches "Jane Doe", plus the birth year
+def dedupe_key(full_name, date_of_birth):
+    tokens = name_tokens(full_name)
+    if not tokens or date_of_birth is None:
+        return None
+    codes = sorted({soundex(tokens[0]), soundex(tokens[-1])})
+    return f"{''.join(codes)}{date_of_birth.year}"
+
+
+# The latest birth date for someone who is at least `years` old on `today`
+def years_ago(today, years):
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        # 29 February in a non-leap year
+        return today.replace(year=today.year - years, day=28)
+
+
+# Whole years between a date and today, computed by the database
+class age_in_years(FunctionElement):
+    type = db.Integer()
+    inherit_cache = True
+
+
+@compiles(age_in_years)
+def _age_in_years(element, compiler, **kw):
+    return f"CAST(EXTRACT(YEAR FROM AGE(CURRENT_DATE, {compiler.process(element.clauses, **kw)})) AS INTEGER)"
+
+
+@compiles(age_in_years, 'sqlite')
+def _age_in_years_sqlite(element, compiler, **kw):
+    dob = compiler.process(element.clauses, **kw)
+    return (
+        f"(CAST(strftime('%Y', 'now') AS INTEGER) - CAST(strftime('%Y', {dob}) AS INTEGER)"
+        f" - (strftime('%m-%d', 'now') < strftime('%m-%d', {dob})))"
+    )
+
+
+# The current UTC time as a naive timestamp, the database side of utcnow().
+# Postgres' now() is in the session's time zone, which need not be UTC.
+class utc_now(FunctionElement):
+    type = db.DateTime()
+    inherit_cache = True
+
+
+@compiles(utc_now)
+def _utc_now(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utc_now, 'postgresql')
+def _utc_now_postgresql(element, compiler, **kw):
+    return "timezone('utc', now())"
+
 
 class UserRole(enum.Enum):
     ADMIN = "admin"
     DOCTOR = "doctor"
     
-class User(db.Model, SerializerMixin):
+class User(db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(120), nullable = False, unique = True)
     email = db.Column(db.String(120), nullable = False, unique = True)
     password_hash = db.Column(db.String, nullable = False)
-    role = db.Column(db.Enum(UserRole), nullable = False)
+    role = db.Column(db.Enum(UserRole), nullable = False, index = True)
+    # Carried in every JWT; bumping it revokes all tokens issued before
+    token_version = db.Column(db.Integer, nullable = False, default = 0, server_default = '0')
+    # Set on every write while a read replica is configured, to keep the
+    # user's reads on the primary for a while
+    last_write_at = db.Column(db.DateTime, nullable = True)
     
     # Hash the password before saving it to the database
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode("utf-8")
+        self.password_hash = password_hasher.hash(password)
 
     # Check if the given password matches the stored password hash
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    # True when the stored hash uses an outdated work factor
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
+
+    # Invalidate every token issued to this user so far
+    def revoke_tokens(self):
+        self.token_version = (self.token_version or 0) + 1
     
     @validates('email')
     def validate_email(self, key, email):
@@ -48,7 +164,7 @@ class User(db.Model, SerializerMixin):
     
     
 # HealthProgram Model
-class HealthProgram(db.Model, SerializerMixin):
+class HealthProgram(db.Model):
     __tablename__ = 'health_programs'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -58,9 +174,6 @@ class HealthProgram(db.Model, SerializerMixin):
     creator = db.relationship('User', backref='programs')
     enrollments = db.relationship('Enrollment', back_populates='program', lazy=True)
     
-    # exclude creator.programs to avoid recursion depth
-    serialize_rules = ('-creator.programs', '-creator.password_hash', '-creator.role',)
-    
     @validates('name')
     def validate_name(self, key, name):
         if not name.strip():
@@ -69,28 +182,53 @@ class HealthProgram(db.Model, SerializerMixin):
     
 
 # Client Model
-class Client(db.Model, SerializerMixin):
+class Client(db.Model):
     __tablename__ = "clients"
     
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     full_name = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(15), nullable=True)
+    # Kept in step with `phone` by validate_phone and used for phone lookups
+    phone_normalized = db.Column(db.String(15), nullable=True, index=True)
     address = db.Column(db.String(255), nullable=True)
-    date_of_birth = db.Column(db.Date, nullable=False)
+    # Kept in step with full_name and date_of_birth by their validators; see dedupe.py
+    dedupe_key = db.Column(db.String(12), nullable=True, index=True)
+    date_of_birth = db.Column(db.Date, nullable=False, index=True)
     gender = db.Column(db.String(10), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    # server_default stamps rows written outside the ORM; the change feed relies on updated_at
+    created_at = db.Column(db.DateTime, default=utcnow, server_default=utc_now())
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, server_default=utc_now())
 
     enrollments = db.relationship('Enrollment', back_populates='client', lazy=True)
 
-    # Include enrollments and their associated program in serialization
-    serialize_rules = ('-enrollments.client', 'enrollments.program',)
+    __table_args__ = (
+        db.Index('ix_clients_updated_at_id', 'updated_at', 'id'),
+    )
 
     @hybrid_property
     def age(self):
         today = date.today()
         return today.year - self.date_of_birth.year - ((today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day))
 
+    # Selectable in queries, but filters and sorts should use aged_between and
+    # date_of_birth, which the date_of_birth index can serve
+    @age.inplace.expression
+    @classmethod
+    def _age_expression(cls):
+        return age_in_years(cls.date_of_birth)
+
+    # Criteria on date_of_birth matching clients aged `minimum` to `maximum`
+    # inclusive, so age ranges become index range scans
+    @classmethod
+    def aged_between(cls, minimum=None, maximum=None, today=None):
+        today = today or date.today()
+        criteria = []
+        if minimum is not None:
+            criteria.append(cls.date_of_birth <= years_ago(today, minimum))
+        if maximum is not None:
+            criteria.append(cls.date_of_birth > years_ago(today, maximum + 1))
+        return criteria
+
     @validates('gender')
     def validate_gender(self, key, gender):
         allowed = ['Male', 'Female', 'Other']
@@ -102,6 +240,7 @@ class Client(db.Model, SerializerMixin):
     def validate_date_of_birth(self, key, dob):
         if dob >= date.today():
             raise ValueError("Date of birth must be in the past")
+        self.dedupe_key = dedupe_key(self.full_name, dob)
         return dob
 
     @validates('full_name')
@@ -110,6 +249,7 @@ class Client(db.Model, SerializerMixin):
             raise ValueError("Full name must be at least 3 characters long")
         if len(full_name.strip()) > 120:
             raise ValueError("Full name cannot be longer than 120 characters")
+        self.dedupe_key = dedupe_key(full_name, self.date_of_birth)
         return full_name
     
     @validates('address')
@@ -124,39 +264,80 @@ class Client(db.Model, SerializerMixin):
             raise ValueError("Phone number format is invalid. Include country code.")
         if phone and (len(phone) < 10 or len(phone) > 15):
             raise ValueError("Phone number must be between 10 and 15 digits")
+        self.phone_normalized = normalize_phone(phone)
         return phone
     
     
+# The statuses an enrollment can move to from each status
+ENROLLMENT_TRANSITIONS = {
+    'active': ('completed', 'dropped'),
+    'completed': (),
+    'dropped': ('active',),
+}
+
+
 class Enrollment(db.Model):
     __tablename__ = 'enrollments'
+    # The unique pair also serves lookups by client_id
+    __table_args__ = (
+        db.UniqueConstraint('client_id', 'program_id', name='uq_enrollments_client_program'),
+        db.Index('ix_enrollments_program_id_id', 'program_id', 'id'),
+        db.Index('ix_enrollments_program_id_updated_at', 'program_id', 'updated_at'),
+        db.Index('ix_enrollments_status_program_id', 'status', 'program_id'),
+        db.Index('ix_enrollments_updated_at_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
     program_id = db.Column(db.Integer, db.ForeignKey('health_programs.id'), nullable=False)
-    enrolled_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    enrolled_at = db.Column(db.DateTime, default=utcnow, server_default=utc_now())
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, server_default=utc_now())
     status = db.Column(db.String(20), default='active')  # active, completed, dropped
 
     client = db.relationship('Client', back_populates='enrollments')
     program = db.relationship('HealthProgram', back_populates='enrollments')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'client_id': self.client_id,
-            'program_id': self.program_id,
-            'client_name': self.client.full_name,  # Use `full_name` from `Client`
-            'program_name': self.program.name,  # Use `name` from `HealthProgram`
-            'enrolled_at': self.enrolled_at.isoformat(),
-            'status': self.status
-        }
-        
-    # Include program in serialization
-    serialize_rules = ('-client.enrollments', '-program.enrollments',)
-    
     @validates('status')
     def validate_status(self, key, status):
-        allowed_statuses = ['active', 'completed', 'dropped']
+        allowed_statuses = list(ENROLLMENT_TRANSITIONS)
         if status not in allowed_statuses:
             raise ValueError(f"Status must be one of {allowed_statuses}")
         return status
+
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+
+# Job Model: work run by `flask run-jobs` outside the request cycle
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    # Workers claim the oldest queued job
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued', server_default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total = db.Column(db.Integer, nullable=True)
+    summary = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    result_name = db.Column(db.String(255), nullable=True)
+    result_mimetype = db.Column(db.String(100), nullable=True)
+    worker = db.Column(db.String(255), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=utcnow, server_default=utc_now())
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Touched by the worker pool while the job runs, so abandoned jobs can be found
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    creator = db.relationship('User', backref='jobs')
+
+    @validates('status')
+    def validate_status(self, key, status):
+        if status not in JOB_STATUSES:
+            raise ValueError(f"Status must be one of {list(JOB_STATUSES)}")
+        return status
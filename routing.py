@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import update
+from sqlalchemy.engine import make_url
+from cache import TTLCache
+
+
+REPLICA_BIND = 'replica'
+
+# Each user's users.last_write_at as this worker last saw it, NEVER for users
+# who have not written. Kept for REPLICA_WRITE_CACHE_SECONDS, which bounds how
+# long a write through another worker can go unnoticed and how often the
+# primary is asked; writes through this worker update it straight away.
+last_writes = TTLCache(ttl=1)
+NEVER = datetime.min
+
+
+# Engine options for a database URL. Pool sizing only applies to queue pools,
+# so SQLite keeps Flask-SQLAlchemy's defaults apart from recycle and pre-ping.
+# The statement timeout is set per connection on Postgres and ignored elsewhere.
+def engine_options(url, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800,
+                   pool_pre_ping=True, statement_timeout=0):
+    options = {'pool_recycle': pool_recycle, 'pool_pre_ping': pool_pre_ping}
+    if not url:
+        return options
+
+    backend = make_url(url).get_backend_name()
+    if backend != 'sqlite':
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    if backend == 'postgresql' and statement_timeout:
+        options['connect_args'] = {'options': f"-c statement_timeout={int(statement_timeout)}"}
+    return options
+
+
+# db.session class that sends queries to the replica bind while a handler
+# marked with @read_replica runs. Flushes, and sessions holding pending
+# changes, always go to the primary.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not (self.new or self.dirty or self.deleted) \
+                and has_request_context() and g.get('read_replica'):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Whether `user_id` wrote in the last REPLICA_STICKY_SECONDS
+def wrote_recently(user_id):
+    from models import db, utcnow, User
+    last_write = last_writes.get(user_id)
+    if last_write is None:
+        last_write = db.session.query(User.last_write_at).filter(User.id == user_id).scalar() or NEVER
+        last_writes.set(user_id, last_write)
+    return last_write > utcnow() - timedelta(seconds=current_app.config['REPLICA_STICKY_SECONDS'])
+
+
+# Run a read-only handler against the replica. Users who wrote recently keep
+# reading from the primary, so they always see their own writes; so do
+# handlers run after g.read_primary is set. The check is made on the server,
+# so it holds for cross-site clients that send no cookies.
+def read_replica(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        user = g.get('current_user')
+        if 'replica_routing' not in current_app.extensions or g.get('read_primary') \
+                or (user is not None and wrote_recently(user.id)):
+            return f(*args, **kwargs)
+        g.read_replica = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.read_replica = False
+    return decorated
+
+
+# Records every successful write by an authenticated user while a replica is
+# configured, in this worker and in users.last_write_at for the others
+class ReplicaRouting:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        app.config.setdefault('REPLICA_WRITE_CACHE_SECONDS', 1)
+        if REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            last_writes.ttl = app.config['REPLICA_WRITE_CACHE_SECONDS']
+            app.extensions['replica_routing'] = self
+            app.after_request(self.after_request)
+
+    def after_request(self, response):
+        user = g.get('current_user')
+        if user is None or request.method not in ('POST', 'PUT', 'PATCH', 'DELETE') or response.status_code >= 400:
+            return response
+
+        from models import db, utcnow, User
+        now = utcnow()
+        last_writes.set(user.id, now)
+        try:
+            db.session.execute(update(User).where(User.id == user.id).values(last_write_at=now))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        return response
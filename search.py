@@ -0,0 +1,59 @@
+import re
+from sqlalchemy import func, literal_column, table, column
+from models import db, Client, normalize_phone
+from serializers import columns, CLIENT_FIELDS
+
+
+# Backed by the clients_fts FTS5 table on SQLite
+clients_fts = table('clients_fts', column('rowid'))
+
+
+# Quote each word of the search and match it as a prefix, so "jan do"
+# finds "Jane Doe" without letting FTS5 query syntax through
+def fts_match_expression(name):
+    words = re.findall(r"\w+", name)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+# Search clients by name, phone and date of birth. Name matches are ranked
+# best first: trigram similarity on Postgres, bm25 over FTS5 on SQLite and
+# plain prefix matching elsewhere. Returns up to `limit` client rows after `offset`.
+def search_clients(name=None, phone=None, dob=None, dob_from=None, dob_to=None, limit=50, offset=0):
+    query = db.session.query(*columns(Client, CLIENT_FIELDS))
+    order_by = []
+
+    if name:
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            similarity = func.similarity(Client.full_name, name)
+            query = query.filter(
+                Client.full_name.op('%')(name) | Client.full_name.ilike(f"{name}%")
+            )
+            order_by.append(similarity.desc())
+        elif dialect == 'sqlite':
+            expression = fts_match_expression(name)
+            if not expression:
+                return []
+            query = query.join(clients_fts, clients_fts.c.rowid == Client.id).filter(
+                literal_column('clients_fts').op('MATCH')(expression)
+            )
+            order_by.append(func.bm25(literal_column('clients_fts')))
+        else:
+            query = query.filter(Client.full_name.ilike(f"{name}%"))
+            order_by.append(Client.full_name)
+
+    if phone:
+        # A phone without digits matches nobody, not every client without a phone
+        phone_normalized = normalize_phone(phone)
+        if not phone_normalized:
+            return []
+        query = query.filter(Client.phone_normalized == phone_normalized)
+
+    if dob is not None:
+        query = query.filter(Client.date_of_birth == dob)
+    if dob_from is not None:
+        query = query.filter(Client.date_of_birth >= dob_from)
+    if dob_to is not None:
+        query = query.filter(Client.date_of_birth <= dob_to)
+
+    return query.order_by(*order_by, Client.id).offset(offset).limit(limit).all()
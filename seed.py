@@ -1,13 +1,20 @@
-from models import db, User, Client, HealthProgram, Enrollment
+from models import db, dedupe_key, utcnow, User, UserRole, Client, HealthProgram, Enrollment, Job
 from faker import Faker
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta, timezone
+from contextlib import contextmanager
+import argparse
+import csv
+import io
+import itertools
 import random
+import time
 
 fake = Faker()
 
 def clear_tables():
     """Clear the database tables before seeding new data."""
     print("Clearing existing data...")
+    Job.query.delete()
     Enrollment.query.delete()
     Client.query.delete()
     HealthProgram.query.delete()
@@ -54,8 +61,8 @@ def seed_clients(n=10):
             address=fake.address(),
             date_of_birth=dob,
             gender=random.choice(['Male', 'Female', 'Other']),
-            created_at=fake.date_time_this_year(tzinfo=timezone.utc),
-            updated_at=datetime.now(timezone.utc)
+            created_at=fake.date_time_this_year(tzinfo=timezone.utc).replace(tzinfo=None),
+            updated_at=utcnow()
         )
         clients.append(client)
         db.session.add(client)
@@ -70,7 +77,7 @@ def seed_enrollments(clients, programs):
             enrollment = Enrollment(
                 client_id=client.id,
                 program_id=program.id,
-                enrolled_at=fake.date_time_this_year(tzinfo=timezone.utc),
+                enrolled_at=fake.date_time_this_year(tzinfo=timezone.utc).replace(tzinfo=None),
                 status=random.choice(['active', 'completed', 'dropped'])
             )
             db.session.add(enrollment)
@@ -85,8 +92,230 @@ def run_seeders():
     seed_enrollments(clients, programs)
     print("Done seeding!")
 
-if __name__ == "__main__":
-    from app import app  # assuming your Flask app is in app.py
+# ---------------------------------------------------------------------------
+# High-volume generator for load-test datasets.
+#
+# Everything is drawn from a single random.Random(seed), so the same options
+# always produce the same rows. Names come from small Faker pools built once,
+# rows are written in Core executemany batches (COPY on Postgres) and ids are
+# assigned here, so nothing is read back while loading.
+# ---------------------------------------------------------------------------
+
+def parse_range(value):
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def parse_weights(value):
+    weights = {}
+    for part in value.split(','):
+        key, _, weight = part.partition('=')
+        weights[key.strip()] = float(weight)
+    return weights
+
+
+# Children first, so DELETE never leaves rows pointing at a removed user
+TABLES = ['jobs', 'enrollments', 'clients', 'health_programs', 'users']
+
+
+@contextmanager
+def bulk_load_mode():
+    """On SQLite, drop the secondary indexes and the clients triggers (full-text
+    search upkeep) while loading, then recreate them and rebuild the search
+    index in one pass each, which is much cheaper than row-by-row upkeep."""
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        yield
+        return
+
+    table_list = ', '.join(f"'{table}'" for table in TABLES)
+    objects = connection.exec_driver_sql(
+        "SELECT type, name, sql FROM sqlite_master "
+        f"WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({table_list})"
+    ).all()
+    for type_, name, _ in objects:
+        connection.exec_driver_sql(f"DROP {type_.upper()} {name}")
+    db.session.commit()
+    try:
+        yield
+    finally:
+        connection = db.session.connection()
+        for _, _, sql in objects:
+            connection.exec_driver_sql(sql)
+        if any(type_ == 'trigger' for type_, _, _ in objects):
+            connection.exec_driver_sql("INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')")
+        db.session.commit()
+
+
+def truncate_tables():
+    """Empty every table in one statement where the database allows it."""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+    else:
+        for table in TABLES:
+            connection.exec_driver_sql(f"DELETE FROM {table}")
+    db.session.commit()
+
+
+def bulk_insert(table, columns, rows):
+    """COPY on Postgres; elsewhere a raw DB-API executemany, skipping
+    SQLAlchemy's per-row parameter processing. Dates and timestamps must
+    already be ISO strings."""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(rows)
+        buffer.seek(0)
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    elif connection.dialect.name == 'sqlite':
+        placeholders = ', '.join('?' for _ in columns)
+        cursor = connection.connection.cursor()
+        cursor.executemany(f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        cursor.close()
+    else:
+        connection.exec_driver_sql(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('%s' for _ in columns)})",
+            rows
+        )
+
+
+def reset_sequences():
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        for table in ['users', 'health_programs', 'clients', 'enrollments']:
+            connection.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+            )
 
-    with app.app_context():
-        run_seeders()
+
+def generate_dataset(clients=100000, programs=20, doctors=10, seed=42, enrollments=(0, 3),
+                     program_skew=1.0, status_weights=None, gender_weights=None,
+                     age=(0, 90), batch_size=20000, log=print):
+    rng = random.Random(seed)
+    Faker.seed(seed)
+    status_weights = status_weights or {'active': 6, 'completed': 3, 'dropped': 1}
+    gender_weights = gender_weights or {'Female': 5, 'Male': 4, 'Other': 1}
+    now = utcnow().replace(microsecond=0)
+    today = now.date()
+    started = time.perf_counter()
+
+    # Pools of names and streets keep per-row work to a few random choices
+    first_names = [fake.first_name() for _ in range(500)]
+    last_names = [fake.last_name() for _ in range(1000)]
+    streets = [fake.street_address() for _ in range(1000)]
+    genders, gender_cum = list(gender_weights), list(itertools.accumulate(gender_weights.values()))
+    statuses, status_cum = list(status_weights), list(itertools.accumulate(status_weights.values()))
+    program_ids = range(1, programs + 1)
+    program_cum = list(itertools.accumulate(1 / (i ** program_skew) for i in program_ids))
+    min_days, max_days = age[0] * 365 + 1, age[1] * 365 + 364
+    min_enrollments, max_enrollments = enrollments[0], min(enrollments[1], programs)
+
+    # Every generated user shares one password hash
+    sample_user = User(username='sample', email='sample@example.com', role=UserRole.DOCTOR)
+    sample_user.set_password('password123')
+
+    user_columns = ('id', 'username', 'email', 'password_hash', 'role', 'token_version')
+    program_columns = ('id', 'name', 'created_by')
+    client_columns = ('id', 'full_name', 'phone', 'phone_normalized', 'address', 'date_of_birth',
+                      'dedupe_key', 'gender', 'created_at', 'updated_at')
+    enrollment_columns = ('id', 'client_id', 'program_id', 'enrolled_at', 'updated_at', 'status')
+
+    with bulk_load_mode():
+        truncate_tables()
+
+        users = [(1, 'admin', 'admin@example.com', sample_user.password_hash, UserRole.ADMIN.name, 0)]
+        users += [(i, f'doctor{i}', f'doctor{i}@example.com', sample_user.password_hash, UserRole.DOCTOR.name, 0)
+                  for i in range(2, doctors + 2)]
+        bulk_insert(User.__table__, user_columns, users)
+        bulk_insert(HealthProgram.__table__, program_columns,
+                    [(i, f'Program {i}', rng.randint(2, doctors + 1)) for i in program_ids])
+
+        client_rows, enrollment_rows = [], []
+        enrollment_id = 0
+        for client_id in range(1, clients + 1):
+            phone = f"07{rng.randrange(10 ** 8):08d}"
+            created_at = now - timedelta(seconds=rng.randrange(365 * 86400))
+            created_at_text = created_at.isoformat(' ', 'microseconds')
+            full_name = f"{rng.choice(first_names)} {rng.choice(last_names)}"
+            date_of_birth = today - timedelta(days=rng.randint(min_days, max_days))
+            client_rows.append((
+                client_id,
+                full_name,
+                phone,
+                phone,
+                rng.choice(streets),
+                date_of_birth.isoformat(),
+                dedupe_key(full_name, date_of_birth),
+                rng.choices(genders, cum_weights=gender_cum)[0],
+                created_at_text,
+                created_at_text
+            ))
+
+            # Popular programs are drawn more often; repeats are skipped
+            picked = set(rng.choices(program_ids, cum_weights=program_cum,
+                                     k=rng.randint(min_enrollments, max_enrollments)))
+            for program_id in sorted(picked):
+                enrollment_id += 1
+                # Within 30 days of registering, but never after the dataset was generated
+                enrolled_at = min(created_at + timedelta(seconds=rng.randrange(30 * 86400)), now).isoformat(' ', 'microseconds')
+                enrollment_rows.append((
+                    enrollment_id, client_id, program_id, enrolled_at, enrolled_at,
+                    rng.choices(statuses, cum_weights=status_cum)[0]
+                ))
+
+            if len(client_rows) >= batch_size or client_id == clients:
+                bulk_insert(Client.__table__, client_columns, client_rows)
+                bulk_insert(Enrollment.__table__, enrollment_columns, enrollment_rows)
+                db.session.commit()
+                client_rows, enrollment_rows = [], []
+                elapsed = time.perf_counter() - started
+                log(f"{client_id} clients, {enrollment_id} enrollments, "
+                    f"{(client_id + enrollment_id) / elapsed:,.0f} rows/s")
+
+        reset_sequences()
+        db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    log(f"Generated {clients} clients and {enrollment_id} enrollments in {elapsed:.1f}s "
+        f"({(clients + enrollment_id) / elapsed:,.0f} rows/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with sample or load-test data.")
+    subcommands = parser.add_subparsers(dest='command')
+    generate = subcommands.add_parser('generate', help="Bulk-generate a reproducible load-test dataset")
+    generate.add_argument('--clients', type=int, default=100000)
+    generate.add_argument('--programs', type=int, default=20)
+    generate.add_argument('--doctors', type=int, default=10)
+    generate.add_argument('--seed', type=int, default=42)
+    generate.add_argument('--enrollments', type=parse_range, default=(0, 3),
+                          help="Enrollments per client as MIN-MAX (default 0-3)")
+    generate.add_argument('--program-skew', type=float, default=1.0,
+                          help="Zipf exponent for program popularity; 0 is uniform")
+    generate.add_argument('--status-weights', type=parse_weights, default=None,
+                          help="e.g. active=6,completed=3,dropped=1")
+    generate.add_argument('--gender-weights', type=parse_weights, default=None,
+                          help="e.g. Female=5,Male=4,Other=1")
+    generate.add_argument('--age', type=parse_range, default=(0, 90), help="Client ages as MIN-MAX")
+    generate.add_argument('--batch-size', type=int, default=20000)
+    args = parser.parse_args()
+
+    from app import create_app
+
+    with create_app().app_context():
+        if args.command == 'generate':
+            generate_dataset(
+                clients=args.clients, programs=args.programs, doctors=args.doctors, seed=args.seed,
+                enrollments=args.enrollments, program_skew=args.program_skew,
+                status_weights=args.status_weights, gender_weights=args.gender_weights,
+                age=args.age, batch_size=args.batch_size
+            )
+        else:
+            run_seeders()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from functools import lru_cache
+from operator import attrgetter
+
+
+# Output formats kept from the SerializerMixin era so payloads do not change
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+USER_FIELDS = ('id', 'username', 'email', 'role')
+CREATOR_FIELDS = ('id', 'username', 'email')
+PROGRAM_FIELDS = ('id', 'name', 'created_by')
+CLIENT_FIELDS = ('id', 'full_name', 'phone', 'address', 'date_of_birth', 'gender', 'created_at', 'updated_at')
+ENROLLMENT_FIELDS = ('id', 'client_id', 'program_id', 'client_name', 'program_name', 'enrolled_at', 'status')
+JOB_FIELDS = ('id', 'kind', 'status', 'progress', 'total', 'summary', 'error', 'created_at', 'started_at', 'finished_at')
+
+
+def _strftime(fmt):
+    return lambda value: value.strftime(fmt)
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _enum_value(value):
+    return value.value
+
+
+# Build a serializer for a fixed list of fields. The returned function reads
+# every field with one attrgetter call, so it works the same on result rows
+# and on ORM objects, and only the listed fields are ever converted.
+def make_serializer(fields, converters=None):
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        single = getter
+        getter = lambda row: (single(row),)
+    converted = [(index, converters[field]) for index, field in enumerate(fields) if field in (converters or {})]
+
+    def serialize(row):
+        values = list(getter(row))
+        for index, convert in converted:
+            if values[index] is not None:
+                values[index] = convert(values[index])
+        return dict(zip(fields, values))
+
+    serialize.fields = fields
+    serialize.converters = converters
+    return serialize
+
+
+# The same serializer limited to `fields`, built once per distinct subset
+@lru_cache(maxsize=256)
+def narrow(serializer, fields):
+    if fields == serializer.fields:
+        return serializer
+    return make_serializer(fields, serializer.converters)
+
+
+serialize_user = make_serializer(USER_FIELDS, {'role': _enum_value})
+serialize_creator = make_serializer(CREATOR_FIELDS)
+serialize_program = make_serializer(PROGRAM_FIELDS)
+serialize_client = make_serializer(CLIENT_FIELDS, {
+    'date_of_birth': _strftime(DATE_FORMAT),
+    'created_at': _strftime(DATETIME_FORMAT),
+    'updated_at': _strftime(DATETIME_FORMAT)
+})
+serialize_enrollment = make_serializer(ENROLLMENT_FIELDS, {'enrolled_at': _isoformat})
+serialize_job = make_serializer(JOB_FIELDS, {
+    'created_at': _strftime(DATETIME_FORMAT),
+    'started_at': _strftime(DATETIME_FORMAT),
+    'finished_at': _strftime(DATETIME_FORMAT)
+})
+
+
+# The mapped columns to select for a serializer's fields
+def columns(model, fields):
+    return [getattr(model, field) for field in fields]
@@ -0,0 +1,59 @@
+from datetime import date
+from sqlalchemy import case, func
+from models import db, years_ago, Client, Enrollment, HealthProgram
+
+
+# (label, minimum age) for each band, youngest first
+AGE_BANDS = (('0-17', 0), ('18-34', 18), ('35-49', 35), ('50-64', 50), ('65+', 65))
+
+
+# CASE expression placing a client in an age band by comparing date_of_birth
+# with fixed cut-off dates, so it can use the date_of_birth index
+def age_band_expression(today=None):
+    today = today or date.today()
+    whens = []
+    for (label, _), (_, next_minimum) in zip(AGE_BANDS, AGE_BANDS[1:]):
+        whens.append((Client.date_of_birth > years_ago(today, next_minimum), label))
+    return case(*whens, else_=AGE_BANDS[-1][0])
+
+
+# Enrollment counts per program by status, gender and age band, computed with
+# a single GROUP BY. Pass program_ids to restrict it to some programs.
+def enrollment_statistics(program_ids=None):
+    age_band = age_band_expression().label('age_band')
+    query = db.session.query(
+        HealthProgram.id,
+        HealthProgram.name,
+        Enrollment.status,
+        Client.gender,
+        age_band,
+        func.count(Enrollment.id)
+    ).outerjoin(
+        Enrollment, Enrollment.program_id == HealthProgram.id
+    ).outerjoin(
+        Client, Client.id == Enrollment.client_id
+    ).group_by(
+        HealthProgram.id, HealthProgram.name, Enrollment.status, Client.gender, age_band
+    ).order_by(HealthProgram.id)
+    if program_ids is not None:
+        query = query.filter(HealthProgram.id.in_(program_ids))
+
+    programs = {}
+    for program_id, name, status, gender, band, count in query:
+        program = programs.setdefault(program_id, {
+            "program_id": program_id,
+            "name": name,
+            "total": 0,
+            "by_status": {},
+            "by_gender": {},
+            "by_age_band": {}
+        })
+        # Programs without enrollments come back as one row with a zero count
+        if not count:
+            continue
+        program['total'] += count
+        program['by_status'][status] = program['by_status'].get(status, 0) + count
+        program['by_gender'][gender] = program['by_gender'].get(gender, 0) + count
+        program['by_age_band'][band] = program['by_age_band'].get(band, 0) + count
+
+    return list(programs.values())
@@ -0,0 +1,119 @@
+import json
+import os
+import re
+
+import pytest
+from flask_migrate import Migrate, upgrade
+from sqlalchemy import event
+
+from app import create_app
+from models import db
+from seed import generate_dataset
+
+
+# EXPLAIN every statement the hot endpoints run against a seeded database and
+# fail when one reads a table without an index. SQLite always runs; set
+# TEST_POSTGRES_URL to a scratch Postgres database to check its plans too.
+# The tests build the schema from the migrations and empty the database first.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'password123'
+TABLES = {'users', 'health_programs', 'clients', 'enrollments', 'jobs'}
+
+# (method, path, body, tables the endpoint may scan and why)
+CASES = [
+    # Pages in id order walk the primary key until LIMIT, which SQLite
+    # reports as a plain SCAN
+    ('GET', '/clients', None, {'clients'}),
+    ('GET', '/clients?after=100', None, set()),
+    ('GET', '/clients?min_age=20&max_age=40', None, set()),
+    ('GET', '/clients?sort=age', None, set()),
+    ('GET', '/clients?sort=age&after=10', None, set()),
+    ('GET', '/clients?sort=-age&min_age=20&max_age=40', None, set()),
+    ('GET', '/clients/5', None, set()),
+    # Every program is listed, so every program is read
+    ('GET', '/programs', None, {'health_programs'}),
+    ('GET', '/programs/1', None, set()),
+    ('GET', '/programs/1?after=50', None, set()),
+    ('POST', '/enroll-client', {'client_ids': [1, 2, 3], 'program_ids': [1, 2]}, set()),
+    ('POST', '/enrollments/status', {'status': 'completed', 'program_id': 1}, set()),
+    ('POST', '/enrollments/status', {'status': 'dropped', 'client_ids': [1, 2]}, set()),
+    ('GET', '/changes', None, set()),
+    ('GET', '/changes?since=2000-01-01T00:00:00', None, set()),
+    ('GET', '/check-admin', None, set()),
+]
+
+BACKENDS = ['sqlite'] + (['postgresql'] if os.getenv('TEST_POSTGRES_URL') else [])
+
+
+@pytest.fixture(scope='module', params=BACKENDS)
+def client(request, tmp_path_factory):
+    if request.param == 'sqlite':
+        url = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}"
+    else:
+        url = os.environ['TEST_POSTGRES_URL']
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'SECRET_KEY': 'query-plan-tests-' * 2})
+    Migrate(app, db, directory=os.path.join(ROOT, 'migrations'))
+    with app.app_context():
+        upgrade()
+        generate_dataset(clients=2000, programs=6, doctors=2, log=lambda *args: None)
+
+    client = app.test_client()
+    response = client.post('/login', json={'email': 'doctor2@example.com', 'password': PASSWORD})
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {response.get_json()['token']}"
+    yield client
+    with app.app_context():
+        db.engine.dispose()
+
+
+# Statements the request ran, as (sql, parameters)
+def capture(client, method, path, body):
+    app = client.application
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.open(path, method=method, json=body)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code < 400, response.get_data(as_text=True)
+    return statements
+
+
+# Tables read without an index. SQLite says "SCAN <table>" for those; Postgres
+# is told to avoid sequential scans, so a Seq Scan left in the plan is one no
+# index could replace.
+def sequential_scans(connection, statement, parameters):
+    if connection.dialect.name == 'sqlite':
+        plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        matches = (re.fullmatch(r'SCAN (\w+)', row[-1]) for row in plan)
+        return {match.group(1) for match in matches if match and match.group(1) in TABLES}
+
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    scans, nodes = set(), [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scans.add(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+@pytest.mark.parametrize('method, path, body, allowed', CASES, ids=[f"{m} {p}" for m, p, _, _ in CASES])
+def test_endpoint_queries_use_indexes(client, method, path, body, allowed):
+    statements = capture(client, method, path, body)
+    assert statements
+
+    with client.application.app_context():
+        with db.engine.connect() as connection:
+            for statement, parameters in statements:
+                scans = sequential_scans(connection, statement, parameters) - allowed
+                assert not scans, f"{method} {path} scans {', '.join(sorted(scans))}:\n{statement}"
@@ -0,0 +1,123 @@
+import datetime
+import os
+import shutil
+import sqlite3
+
+import pytest
+from flask_migrate import Migrate, upgrade
+from sqlalchemy import event, update
+
+from app import create_app
+from models import db, User
+from routing import last_writes
+from seed import generate_dataset
+
+
+# Read routing against two local SQLite files. The replica is a copy of the
+# primary in which program 1 is renamed, so each response shows which
+# database answered it.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRIMARY_NAME, REPLICA_NAME = 'Program 1', 'Program 1 (replica)'
+NEW_CLIENT = {'full_name': 'Jane Doe', 'gender': 'Female', 'phone': '+254712345678', 'date_of_birth': '1990-05-15'}
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('replica')
+    primary, replica = directory / 'primary.db', directory / 'replica.db'
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{primary}",
+        'SQLALCHEMY_BINDS': {'replica': f"sqlite:///{replica}"},
+        'SECRET_KEY': 'replica-routing-tests-' * 2,
+        'REPLICA_STICKY_SECONDS': 60,
+        'REPLICA_WRITE_CACHE_SECONDS': 60,
+    })
+    Migrate(app, db, directory=os.path.join(ROOT, 'migrations'))
+    with app.app_context():
+        upgrade()
+        generate_dataset(clients=50, programs=2, doctors=1, log=lambda *args: None)
+        db.engine.dispose()
+
+    shutil.copyfile(primary, replica)
+    with sqlite3.connect(replica) as connection:
+        connection.execute("UPDATE health_programs SET name = ? WHERE id = 1", (REPLICA_NAME,))
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    # Every test starts as a user who has not written, on a fresh worker
+    with app.app_context():
+        db.session.execute(update(User).values(last_write_at=None))
+        db.session.commit()
+    last_writes.clear()
+
+    client = app.test_client()
+    response = client.post('/login', json={'email': 'doctor2@example.com', 'password': 'password123'})
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {response.get_json()['token']}"
+    return client
+
+
+def program_name(client):
+    response = client.get('/programs/1')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()['name']
+
+
+# Statements `client` sends to the primary while running `path`
+def primary_statements(app, client, path):
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return statements
+
+
+def test_reads_go_to_the_replica(client):
+    assert program_name(client) == REPLICA_NAME
+
+
+def test_reads_stay_on_the_primary_after_a_write(app, client):
+    assert client.post('/clients', json=NEW_CLIENT).status_code == 201
+    assert program_name(client) == PRIMARY_NAME
+
+    # Another worker finds the write in users.last_write_at
+    last_writes.clear()
+    assert program_name(client) == PRIMARY_NAME
+
+    # Once the write is older than REPLICA_STICKY_SECONDS reads go back to the replica
+    with app.app_context():
+        db.session.execute(update(User).values(last_write_at=datetime.datetime(2000, 1, 1)))
+        db.session.commit()
+    last_writes.clear()
+    assert program_name(client) == REPLICA_NAME
+
+
+def test_last_write_is_read_once_per_cache_period(app, client):
+    assert any('last_write_at' in statement for statement in primary_statements(app, client, '/programs/1'))
+    assert not any('last_write_at' in statement for statement in primary_statements(app, client, '/programs/1'))
+
+
+def test_batch_reads_use_the_primary(client):
+    response = client.post('/batch', json={'operations': [
+        {'id': 'patient', 'method': 'POST', 'path': '/clients', 'body': NEW_CLIENT},
+        {'method': 'GET', 'path': '/clients/$patient.client.id'},
+        {'method': 'GET', 'path': '/programs/1'},
+    ]})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    created, fetched, program = response.get_json()['results']
+    assert fetched['status'] == 200
+    assert fetched['body']['id'] == created['body']['client']['id']
+    assert program['body']['name'] == PRIMARY_NAME
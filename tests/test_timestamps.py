@@ -0,0 +1,113 @@
+import datetime
+import os
+
+import pytest
+from flask_migrate import Migrate, upgrade
+from sqlalchemy import event, text
+
+from app import create_app
+from enrollments import transition_enrollments
+from importer import build_client_row, insert_client_rows
+from models import db, Client, Enrollment
+from seed import generate_dataset
+
+
+# Timestamp columns are naive UTC whoever writes them: the ORM defaults, the
+# bulk UPDATE and INSERT paths and the server defaults. On Postgres every
+# connection runs in a time zone far from UTC, where an aware value or a
+# plain now() would be stored as local time.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSION_TIME_ZONE = 'Pacific/Kiritimati'  # UTC+14
+BACKENDS = ['sqlite'] + (['postgresql'] if os.getenv('TEST_POSTGRES_URL') else [])
+
+
+@pytest.fixture(scope='module', params=BACKENDS)
+def app(request, tmp_path_factory):
+    if request.param == 'sqlite':
+        url = f"sqlite:///{tmp_path_factory.mktemp('timestamps') / 'timestamps.db'}"
+    else:
+        url = os.environ['TEST_POSTGRES_URL']
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': url, 'SECRET_KEY': 'timestamp-tests-' * 2, 'CHANGE_FEED_LAG_SECONDS': 0
+    })
+    Migrate(app, db, directory=os.path.join(ROOT, 'migrations'))
+    with app.app_context():
+        if request.param == 'postgresql':
+            @event.listens_for(db.engine, 'connect')
+            def set_time_zone(connection, record):
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SET TIME ZONE '{SESSION_TIME_ZONE}'")
+            db.engine.dispose()
+        upgrade()
+        generate_dataset(clients=20, programs=2, doctors=1, log=lambda *args: None)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def assert_utc_now(value):
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    assert value.tzinfo is None
+    assert abs(value - now) < datetime.timedelta(minutes=1), f"{value} is not UTC (now {now})"
+
+
+def new_client_row(name):
+    return build_client_row({
+        'full_name': name, 'gender': 'Female', 'phone': '0712345678', 'date_of_birth': '1990-01-01'
+    })
+
+
+def test_orm_defaults_are_utc(app):
+    with app.app_context():
+        client = Client(full_name='Orm Default', gender='Female', phone='0712345678', date_of_birth=datetime.date(1990, 1, 1))
+        db.session.add(client)
+        db.session.commit()
+        db.session.expire_all()
+        assert_utc_now(client.created_at)
+        assert_utc_now(client.updated_at)
+
+
+def test_bulk_writers_are_utc(app):
+    with app.app_context():
+        enrollment_id = db.session.query(Enrollment.id).filter(Enrollment.status == 'active').order_by(Enrollment.id).limit(1).scalar()
+        assert transition_enrollments('completed', Enrollment.id == enrollment_id) == 1
+        insert_client_rows([new_client_row('Bulk Insert')])
+        db.session.commit()
+
+        assert_utc_now(db.session.get(Enrollment, enrollment_id).updated_at)
+        imported = db.session.query(Client).filter(Client.full_name == 'Bulk Insert').one()
+        assert_utc_now(imported.created_at)
+        assert_utc_now(imported.updated_at)
+
+
+def test_server_defaults_are_utc(app):
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            pytest.skip("SQLite tables keep no server defaults; the ORM stamps every row")
+        row = new_client_row('Server Default')
+        columns = ', '.join(row)
+        db.session.execute(text(f"INSERT INTO clients ({columns}) VALUES ({', '.join(':' + c for c in row)})"), row)
+        db.session.commit()
+        created_at, updated_at = db.session.execute(
+            text("SELECT created_at, updated_at FROM clients WHERE full_name = 'Server Default'")
+        ).one()
+        assert_utc_now(created_at)
+        assert_utc_now(updated_at)
+
+
+# A row stamped in local time ahead of UTC would sort after `until` and be held back
+def test_change_feed_sees_new_rows(app):
+    client = app.test_client()
+    response = client.post('/login', json={'email': 'doctor2@example.com', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+    since = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)).isoformat()
+
+    response = client.post('/clients', headers=headers, json={
+        'full_name': 'Change Feed', 'gender': 'Male', 'phone': '0722000000', 'date_of_birth': '1985-05-05'
+    })
+    assert response.status_code == 201, response.get_data(as_text=True)
+
+    response = client.get('/changes', headers=headers, query_string={'since': since})
+    assert response.status_code == 200
+    assert 'Change Feed' in [entry['full_name'] for entry in response.get_json()['clients']]